@@ -1,19 +1,40 @@
+import time
+IMPORT_STARTED = time.perf_counter()
 import os
 import json
 import base64
 import requests
-from flask import Flask, request, jsonify
-import time
-from threading import Thread
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from flask import Flask, Response, request, jsonify
+from threading import Thread, Lock, Event, BoundedSemaphore, local
+import queue
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, as_completed, wait, FIRST_COMPLETED, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+import uuid
+import socket
+import random
 import re
-from groq import Groq
+import importlib
+import subprocess
 import sys
 import logging
 from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
+from html.parser import HTMLParser
 import csv
-from io import StringIO
+import multiprocessing
+import math
+from array import array
+from itertools import islice, chain
+from io import StringIO, BytesIO
 import hashlib
+import mmap
+import tempfile
+import sqlite3
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from urllib.parse import parse_qsl, urlencode
 
 logging.basicConfig(
     level=logging.INFO,
@@ -28,20 +49,974 @@ EMAIL = "24f2005903@ds.study.iitm.ac.in"
 SECRET = "my_secret_key_12345"
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "")
 
-try:
-    groq_client = Groq(api_key=GROQ_API_KEY)
-    logger.info("✓ Groq client initialized")
-except Exception as e:
-    logger.error(f"✗ Groq init failed: {e}")
-    groq_client = None
+QUIZ_WORKERS = int(os.environ.get("QUIZ_WORKERS", 2))
+QUIZ_QUEUE_DEPTH = int(os.environ.get("QUIZ_QUEUE_DEPTH", 8))
+JOB_HISTORY = int(os.environ.get("JOB_HISTORY", 100))
+JOB_DB = os.environ.get("JOB_DB", "")
+JOB_LEASE = float(os.environ.get("JOB_LEASE", 60))
+JOB_POLL = float(os.environ.get("JOB_POLL", 1.0))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+JOB_PROCESSES = int(os.environ.get("JOB_PROCESSES", 2))
+
+FETCH_CACHE_BYTES = int(os.environ.get("FETCH_CACHE_BYTES", 64 * 1024 * 1024))
+FETCH_CACHE_ENTRIES = int(os.environ.get("FETCH_CACHE_ENTRIES", 1024))
+FETCH_CACHE_PARSED = int(os.environ.get("FETCH_CACHE_PARSED", 256))
+FETCH_CACHE_PARSED_BYTES = int(os.environ.get("FETCH_CACHE_PARSED_BYTES", 128 * 1024 * 1024))
+FETCH_CACHE_DIR = os.environ.get("FETCH_CACHE_DIR", "")
+FETCH_CACHE_DISK_BYTES = int(os.environ.get("FETCH_CACHE_DISK_BYTES", 512 * 1024 * 1024))
+ARTIFACT_MAX_BYTES = int(os.environ.get("ARTIFACT_MAX_BYTES", 64 * 1024 * 1024))
+ARTIFACT_SPOOL_BYTES = int(os.environ.get("ARTIFACT_SPOOL_BYTES", 8 * 1024 * 1024))
+ARTIFACT_JOB_BYTES = int(os.environ.get("ARTIFACT_JOB_BYTES", 256 * 1024 * 1024))
+ARTIFACT_MEMORY_BYTES = int(os.environ.get("ARTIFACT_MEMORY_BYTES", 512 * 1024 * 1024))
+ARTIFACT_DIR = os.environ.get("ARTIFACT_DIR", "")
+ARTIFACT_CHUNK_BYTES = 64 * 1024
+FETCH_CACHE_TTLS = {
+    "html": int(os.environ.get("FETCH_CACHE_TTL_HTML", 60)),
+    "json": int(os.environ.get("FETCH_CACHE_TTL_JSON", 600)),
+    "default": int(os.environ.get("FETCH_CACHE_TTL", 3600)),
+}
+
+GROQ_MODEL = "llama-3.3-70b-versatile"
+SYSTEM_PROMPT = "Extract exact values. Return valid JSON only."
+LLM_CACHE_ENTRIES = int(os.environ.get("LLM_CACHE_ENTRIES", 512))
+LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", 24 * 3600))
+LLM_CACHE_DB = os.environ.get("LLM_CACHE_DB", "")
+
+CSV_SNIFF_BYTES = int(os.environ.get("CSV_SNIFF_BYTES", 64 * 1024))
+CSV_CHUNK_ROWS = 4096
+# Only these characters can make up a finite float (thousands separators included)
+CSV_NUMBERISH = re.compile(r"[\d\s,.+\-eE_]*\d[\d\s,.+\-eE_]*")
+# The same, and blank cells, as whole lines of a newline-joined column
+CSV_NUMBERISH_LINE = re.compile(r"^[^\S\n]*[\d,.+\-eE_ ]*\d[\d,.+\-eE_ ]*?[^\S\n]*$", re.M)
+CSV_BLANK_LINE = re.compile(r"^[^\S\n]*$", re.M)
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", 6000))
+PROMPT_SNIPPET_TOKENS = 120
+PROMPT_FACTS_SHARE = 0.5
+PROMPT_SCAN_CHARS = 400_000
+PROMPT_TOKEN = re.compile(r"\w{1,4}|[^\w\s]")
+PROMPT_TERM = re.compile(r"[a-z_][a-z0-9_]{2,}|\d+(?:\.\d+)?")
+PROMPT_STOPWORDS = frozenset(
+    "the and for with that this from what which your you are was were has have how many much "
+    "into than then there their them these those each all any its use using value values file "
+    "data page question answer submit post json url http https www".split()
+)
+
+SQL_BATCH_STATEMENTS = 500
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", 2))
+PDF_MAX_PAGES = int(os.environ.get("PDF_MAX_PAGES", 200))
+PDF_TIME_BUDGET = float(os.environ.get("PDF_TIME_BUDGET", 20))
+PDF_PARALLEL_MIN_PAGES = 8
+PDF_MAX_TABLES = 20
+SQL_QUERY_TIMEOUT = float(os.environ.get("SQL_QUERY_TIMEOUT", 2))
+SQL_QUERY_ROWS = 50
+SQL_LOCAL_QUERIES = os.environ.get("SQL_LOCAL_QUERIES", "1") == "1"
+JSON_STREAM_DEPTH = 3
+JSON_MAX_PATHS = 200
+JSON_SAMPLE_RECORDS = 5
+JSON_SAMPLE_ARRAYS = 3
+JSON_SAMPLE_CHARS = 600
+JSON_LOOKUP_VALUES = 5
+JSON_BATCH_RECORDS = 1024
+JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+JSON_DECODER = json.JSONDecoder()
+
+LOCAL_SOLVER_THRESHOLD = float(os.environ.get("LOCAL_SOLVER_THRESHOLD", 0.85))
+
+CHAIN_TIME_BUDGET = float(os.environ.get("CHAIN_TIME_BUDGET", 170))
+SUBMIT_RESERVE = float(os.environ.get("SUBMIT_RESERVE", 8))
+MIN_QUESTION_TIME = float(os.environ.get("MIN_QUESTION_TIME", 12))
+GROQ_TIMEOUT = float(os.environ.get("GROQ_TIMEOUT", 60))
+GROQ_BASE_URL = os.environ.get("GROQ_BASE_URL", "")
+GROQ_RPM = int(os.environ.get("GROQ_RPM", 30))
+GROQ_TPM = int(os.environ.get("GROQ_TPM", 12000))
+GROQ_CONCURRENCY = int(os.environ.get("GROQ_CONCURRENCY", 4))
+GROQ_RETRIES = int(os.environ.get("GROQ_RETRIES", 3))
+GROQ_BACKOFF = float(os.environ.get("GROQ_BACKOFF", 1.0))
+GROQ_EXPECTED_COMPLETION = 512
+GROQ_STREAM = os.environ.get("GROQ_STREAM", "1") == "1"
+GROQ_STREAM_STOP_FIELDS = ("file_urls", "scrape_urls", "answer")
+TRACE_QUESTIONS = os.environ.get("TRACE_QUESTIONS", "1") == "1"
+MIN_CALL_TIMEOUT = 1.0
+
+FETCH_CONCURRENCY = int(os.environ.get("FETCH_CONCURRENCY", 4))
+PREFETCH_WAIT = float(os.environ.get("PREFETCH_WAIT", 5))
+PREFETCH_MAX_LINKS = int(os.environ.get("PREFETCH_MAX_LINKS", 8))
+PREFETCH_EXTENSIONS = ('.csv', '.json', '.pdf', '.sql', '.txt')
+
+HTTP_POOL_HOSTS = int(os.environ.get("HTTP_POOL_HOSTS", 10))
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 10))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 10))
+HTTP_TIMEOUTS = {
+    "page": (HTTP_CONNECT_TIMEOUT, float(os.environ.get("HTTP_PAGE_TIMEOUT", 30))),
+    "download": (HTTP_CONNECT_TIMEOUT, float(os.environ.get("HTTP_DOWNLOAD_TIMEOUT", 60))),
+    "submit": (HTTP_CONNECT_TIMEOUT, float(os.environ.get("HTTP_SUBMIT_TIMEOUT", 30))),
+}
+HTTP_HEDGE = os.environ.get("HTTP_HEDGE", "1") == "1"
+HTTP_HEDGE_DELAY = float(os.environ.get("HTTP_HEDGE_DELAY", 2.0))
+HTTP_HEDGE_MIN_DELAY = float(os.environ.get("HTTP_HEDGE_MIN_DELAY", 0.05))
+HTTP_HEDGE_PERCENTILE = float(os.environ.get("HTTP_HEDGE_PERCENTILE", 95))
+HTTP_HEDGE_WINDOW = 200
+HTTP_HEDGE_MIN_SAMPLES = 20
+HTTP_BREAKER_FAILURES = int(os.environ.get("HTTP_BREAKER_FAILURES", 5))
+HTTP_BREAKER_COOLDOWN = float(os.environ.get("HTTP_BREAKER_COOLDOWN", 15))
+WARMUP_URLS = [u.strip() for u in os.environ.get("WARMUP_URLS", "").split(",") if u.strip()]
+WARMUP_GROQ = os.environ.get("WARMUP_GROQ", "1") == "1"
+
+startup_stats = {"import_ms": None, "imports": {}, "warmup": {}, "warmup_ms": None}
+startup_lock = Lock()
+warmup_done = Event()
+warmup_thread = None
+
+def lazy_import(name):
+    """Import a heavy module on first use instead of at startup, recording what it cost"""
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    with startup_lock:
+        startup_stats["imports"].setdefault(name, round((time.perf_counter() - started) * 1000, 1))
+    return module
+
+groq = None
+groq_client = None
+groq_init_error = None
+groq_client_lock = Lock()
+
+def get_groq_client():
+    """The Groq client, importing groq and building it on first use; None if that failed"""
+    global groq, groq_client, groq_init_error
+    if groq_client is not None:
+        return groq_client
+    with groq_client_lock:
+        if groq_client is None and groq_init_error is None:
+            try:
+                groq = lazy_import("groq")
+                groq_client = groq.Groq(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL or None, max_retries=0)
+                logger.info("✓ Groq client initialized")
+            except Exception as e:
+                groq_init_error = str(e)
+                logger.error(f"✗ Groq init failed: {e}")
+        return groq_client
+
+class DeadlineExceeded(Exception):
+    pass
+
+class Deadline:
+    """Absolute time budget shared by every stage of a question"""
+    def __init__(self, seconds, expires=None):
+        self.expires = expires if expires is not None else time.time() + seconds
+    
+    def remaining(self):
+        return max(self.expires - time.time(), 0)
+    
+    def expired(self):
+        return time.time() >= self.expires
+    
+    def child(self, reserve):
+        """A tighter deadline that leaves reserve seconds for later stages"""
+        return Deadline(0, expires=self.expires - reserve)
+    
+    def timeout(self, cap):
+        """Per-call timeout: the stage's usual cap, shrunk to what is left"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("time budget spent")
+        return max(min(cap, remaining), MIN_CALL_TIMEOUT)
+
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+METRIC_HELP = {
+    "quiz_stage_seconds": ("histogram", "Time spent in each stage of a question"),
+    "quiz_http_request_seconds": ("histogram", "Latency of outbound HTTP requests by kind"),
+    "quiz_http_bytes_total": ("counter", "Response bytes downloaded by kind"),
+    "quiz_http_hedges_total": ("counter", "Duplicate GETs sent after a host's hedge threshold, by kind"),
+    "quiz_http_hedge_wins_total": ("counter", "Duplicate GETs that answered before the original, by kind"),
+    "quiz_http_breaker_events_total": ("counter", "Per-host circuit breaker openings, closings and fast failures"),
+    "quiz_llm_request_seconds": ("histogram", "Latency of Groq completions sent by the gateway"),
+    "quiz_llm_tokens_total": ("counter", "Tokens spent on Groq completions"),
+    "quiz_cache_events_total": ("counter", "Fetch and LLM cache lookups by outcome"),
+    "quiz_questions_total": ("counter", "Questions submitted by result"),
+    "quiz_chains_total": ("counter", "Quiz chains finished"),
+    "quiz_chain_correct": ("histogram", "Questions answered correctly per chain"),
+    "quiz_queue_depth": ("gauge", "Jobs waiting in the queue"),
+    "quiz_jobs_running": ("gauge", "Jobs being processed by workers"),
+    "quiz_llm_in_flight": ("gauge", "Groq completions in flight"),
+}
+CHAIN_BUCKETS = (0, 1, 2, 5, 10, 15, 20, 25)
+
+metric_counters = {}
+metric_histograms = {}
+metrics_lock = Lock()
+trace_state = local()
+
+def metric_key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def inc_metric(name, amount=1, **labels):
+    key = metric_key(name, labels)
+    with metrics_lock:
+        metric_counters[key] = metric_counters.get(key, 0) + amount
+
+def observe_metric(name, value, buckets=METRIC_BUCKETS, **labels):
+    key = metric_key(name, labels)
+    with metrics_lock:
+        histogram = metric_histograms.get(key)
+        if histogram is None:
+            histogram = metric_histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(histogram["buckets"]):
+            if value <= bound:
+                histogram["counts"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+def traced(fn):
+    """Wrap fn so spans it opens on a pool thread land in the caller's trace"""
+    spans = getattr(trace_state, "spans", None)
+    started = getattr(trace_state, "started", None)
+    def run(*args, **kwargs):
+        trace_state.spans, trace_state.started = spans, started
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            trace_state.spans = None
+    return run
+
+def start_trace():
+    """Collect spans opened on this thread into a per-question trace"""
+    trace_state.spans = [] if TRACE_QUESTIONS else None
+    trace_state.started = time.time()
+
+def finish_trace():
+    spans = getattr(trace_state, "spans", None)
+    trace_state.spans = None
+    return spans
+
+@contextmanager
+def span(stage, **attrs):
+    """Time a stage into quiz_stage_seconds and the current question's trace"""
+    started = time.time()
+    error = None
+    try:
+        yield attrs
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        elapsed = time.time() - started
+        observe_metric("quiz_stage_seconds", elapsed, stage=stage)
+        spans = getattr(trace_state, "spans", None)
+        if spans is not None:
+            record = {"stage": stage, "at_ms": round((started - trace_state.started) * 1000), "ms": round(elapsed * 1000, 1)}
+            record.update(attrs)
+            if error:
+                record["error"] = error
+            spans.append(record)
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (f'{k}="{escape_label(v)}"' for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+def render_metrics(gauges):
+    """Prometheus text exposition of every counter, histogram and the given gauges"""
+    with metrics_lock:
+        counters = dict(metric_counters)
+        histograms = {k: dict(v, counts=list(v["counts"])) for k, v in metric_histograms.items()}
+    
+    series = {}
+    for (name, labels), value in sorted(counters.items()):
+        series.setdefault(name, []).append(f"{name}{format_labels(labels)} {value}")
+    for (name, labels), histogram in sorted(histograms.items(), key=lambda item: item[0]):
+        lines = series.setdefault(name, [])
+        for bound, count in zip(histogram["buckets"], histogram["counts"]):
+            lines.append(f"{name}_bucket{format_labels(labels, [('le', bound)])} {count}")
+        lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+        lines.append(f"{name}_sum{format_labels(labels)} {round(histogram['sum'], 6)}")
+        lines.append(f"{name}_count{format_labels(labels)} {histogram['count']}")
+    for name, value in gauges.items():
+        series[name] = [f"{name} {value}"]
+    
+    out = []
+    for name in sorted(series):
+        kind, help_text = METRIC_HELP.get(name, ("untyped", name))
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(series[name])
+    return "\n".join(out) + "\n"
+
+http_stats = {}
+http_stats_lock = Lock()
+
+def record_http(host, requests_made=0, connections=0, connect_time=0.0):
+    """Accumulate per-host request and connection counters"""
+    with http_stats_lock:
+        stats = http_stats.setdefault(host, {"requests": 0, "connections": 0, "connect_time": 0.0})
+        stats["requests"] += requests_made
+        stats["connections"] += connections
+        stats["connect_time"] += connect_time
+
+class CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.time()
+        super().connect()
+        record_http(self.host, connections=1, connect_time=time.time() - started)
+
+class CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started = time.time()
+        super().connect()
+        record_http(self.host, connections=1, connect_time=time.time() - started)
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = CountingHTTPConnection
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = CountingHTTPSConnection
+
+class PooledAdapter(HTTPAdapter):
+    """Keep-alive adapter whose pools count the connections they open"""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool,
+        }
+
+http_session = requests.Session()
+for scheme in ("http://", "https://"):
+    http_session.mount(scheme, PooledAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE))
+
+class CircuitOpen(requests.ConnectionError):
+    """Raised without touching the network while a host's breaker is open"""
+
+http_health = {}
+http_health_lock = Lock()
+
+def endpoint_key(url):
+    """host:port the breaker and hedge windows are kept for; two ports on one host are separate servers"""
+    parsed = urlparse(url)
+    port = parsed.port or {"http": 80, "https": 443}.get(parsed.scheme)
+    return f"{(parsed.hostname or '').lower()}:{port}"
+
+def host_health(host):
+    """Per-host latency window, breaker state and hedge counters; call with http_health_lock held"""
+    health = http_health.get(host)
+    if health is None:
+        health = http_health[host] = {
+            "latency": {}, "state": "closed", "failures": 0, "opened": 0.0, "probing": False,
+            "hedges": 0, "hedge_wins": 0, "rejected": 0, "opened_count": 0,
+        }
+    return health
+
+def record_latency(host, kind, seconds):
+    with http_health_lock:
+        window = host_health(host)["latency"].setdefault(kind, deque(maxlen=HTTP_HEDGE_WINDOW))
+        window.append(seconds)
+
+def hedge_delay(host, kind):
+    """How long to wait before hedging: the host's recent p95 for this kind, or HTTP_HEDGE_DELAY until it has history"""
+    with http_health_lock:
+        window = list(host_health(host)["latency"].get(kind, ()))
+    if len(window) < HTTP_HEDGE_MIN_SAMPLES:
+        return HTTP_HEDGE_DELAY
+    window.sort()
+    return max(window[int(len(window) * HTTP_HEDGE_PERCENTILE / 100)], HTTP_HEDGE_MIN_DELAY)
+
+def breaker_admit(host):
+    """Fail fast while host's breaker is open; after the cooldown let one probe through"""
+    if HTTP_BREAKER_FAILURES <= 0:
+        return
+    with http_health_lock:
+        health = host_health(host)
+        if health["state"] == "open" and time.time() - health["opened"] >= HTTP_BREAKER_COOLDOWN:
+            health["state"] = "half_open"
+        if health["state"] == "half_open" and not health["probing"]:
+            health["probing"] = True
+            return
+        if health["state"] == "closed":
+            return
+        health["rejected"] += 1
+    inc_metric("quiz_http_breaker_events_total", event="rejected")
+    raise CircuitOpen(f"Circuit open for {host}: failing fast")
+
+def breaker_record(host, ok):
+    """Close the breaker on success; open it after HTTP_BREAKER_FAILURES straight failures or a failed probe.
+
+    ok=None (the request failed for a reason that says nothing about the host) only frees the probe slot.
+    """
+    if HTTP_BREAKER_FAILURES <= 0:
+        return
+    with http_health_lock:
+        health = host_health(host)
+        health["probing"] = False
+        was = health["state"]
+        if ok:
+            health["state"], health["failures"] = "closed", 0
+        elif ok is not None:
+            health["failures"] += 1
+            if was == "half_open" or health["failures"] >= HTTP_BREAKER_FAILURES:
+                health["state"], health["opened"] = "open", time.time()
+        state, failures = health["state"], health["failures"]
+        if state == "open" and was != "open":
+            health["opened_count"] += 1
+    if state == "closed" and was != "closed":
+        logger.info(f"🔌 Circuit closed for {host}")
+        inc_metric("quiz_http_breaker_events_total", event="closed")
+    elif state == "open" and was != "open":
+        logger.warning(f"🔌 Circuit open for {host} after {failures} failures")
+        inc_metric("quiz_http_breaker_events_total", event="opened")
+
+def request_timeout(kind, deadline):
+    connect_timeout, read_timeout = HTTP_TIMEOUTS[kind]
+    if deadline is not None:
+        connect_timeout, read_timeout = deadline.timeout(connect_timeout), deadline.timeout(read_timeout)
+    return connect_timeout, read_timeout
+
+def send_attempt(url, host, kind, kwargs):
+    """Run one GET on its own thread; the returned future carries the response"""
+    future = Future()
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        started = time.time()
+        try:
+            response = http_session.request("GET", url, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            return
+        if response.status_code < 500:
+            record_latency(host, kind, time.time() - started)
+        future.set_result(response)
+    Thread(target=traced(run), daemon=True, name=f"hedge-{kind}").start()
+    return future
+
+def close_loser(future):
+    """Release the connection of an attempt whose race is already decided"""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+def hedged_get(url, kind, host, deadline, kwargs):
+    """GET that sends a duplicate once the first attempt outlives the host's p95; first response wins.
+
+    Returns (response, attempts sent).
+    """
+    primary = send_attempt(url, host, kind, kwargs)
+    try:
+        return primary.result(timeout=hedge_delay(host, kind)), 1
+    except FuturesTimeout:
+        pass
+    try:
+        timeout = request_timeout(kind, deadline)
+    except DeadlineExceeded:
+        return primary.result(), 1
+    hedge = send_attempt(url, host, kind, dict(kwargs, timeout=timeout))
+    with http_health_lock:
+        host_health(host)["hedges"] += 1
+    inc_metric("quiz_http_hedges_total", kind=kind)
+    
+    pending, error = {primary, hedge}, None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is not None:
+                error = error or future.exception()
+                continue
+            for loser in pending:
+                if not loser.cancel():
+                    loser.add_done_callback(close_loser)
+            if future is hedge:
+                with http_health_lock:
+                    host_health(host)["hedge_wins"] += 1
+                inc_metric("quiz_http_hedge_wins_total", kind=kind)
+            return future.result(), 2
+    raise error
+
+def http_request(method, url, kind, deadline=None, **kwargs):
+    """Send a request through the shared keep-alive session, bounded by deadline.
+
+    GETs are hedged once they outlive the host's recent p95, and every request
+    fails fast while the host's circuit breaker is open.
+    """
+    kwargs.setdefault("timeout", request_timeout(kind, deadline))
+    host = endpoint_key(url)
+    breaker_admit(host)
+    started = time.time()
+    try:
+        if method == "GET" and HTTP_HEDGE:
+            response, attempts = hedged_get(url, kind, host, deadline, kwargs)
+        else:
+            response, attempts = http_session.request(method, url, **kwargs), 1
+    except Exception as e:
+        breaker_record(host, ok=False if isinstance(e, (requests.ConnectionError, requests.Timeout)) else None)
+        raise
+    breaker_record(host, ok=response.status_code < 500)
+    observe_metric("quiz_http_request_seconds", time.time() - started, kind=kind)
+    if not kwargs.get("stream"):
+        inc_metric("quiz_http_bytes_total", len(response.content), kind=kind)
+    record_http(urlparse(response.url or url).hostname or "", requests_made=attempts)
+    return response
+
+def http_health_snapshot():
+    """Per-host breaker state, hedge counts and current hedge thresholds"""
+    with http_health_lock:
+        hosts = {h: dict(v, latency={k: list(w) for k, w in v["latency"].items()}) for h, v in http_health.items()}
+    result = {"hedges": 0, "hedge_wins": 0, "rejected": 0, "hosts": {}}
+    for host, health in hosts.items():
+        for key in ("hedges", "hedge_wins", "rejected"):
+            result[key] += health[key]
+        result["hosts"][host] = {
+            "state": health["state"],
+            "failures": health["failures"],
+            "opened": health["opened_count"],
+            "rejected": health["rejected"],
+            "hedges": health["hedges"],
+            "hedge_wins": health["hedge_wins"],
+            "hedge_after_ms": {kind: round(hedge_delay(host, kind) * 1000, 1) for kind in health["latency"]},
+        }
+    result["hedge_win_ratio"] = round(result["hedge_wins"] / result["hedges"], 3) if result["hedges"] else None
+    return result
+
+def http_stats_snapshot():
+    """Totals and per-host connection reuse, with the handshake time it saved"""
+    with http_stats_lock:
+        hosts = {h: dict(v) for h, v in http_stats.items()}
+    
+    def summarize(stats):
+        reused = max(stats["requests"] - stats["connections"], 0)
+        avg_connect = stats["connect_time"] / stats["connections"] if stats["connections"] else 0
+        return {
+            "requests": stats["requests"],
+            "connections": stats["connections"],
+            "reused": reused,
+            "avg_connect_ms": round(avg_connect * 1000, 2),
+            "saved_ms": round(reused * avg_connect * 1000, 2),
+        }
+    
+    totals = {"requests": 0, "connections": 0, "connect_time": 0.0}
+    for stats in hosts.values():
+        for key in totals:
+            totals[key] += stats[key]
+    
+    result = summarize(totals)
+    result["hosts"] = {h: summarize(v) for h, v in hosts.items()}
+    return result
+
+fetch_cache_index = OrderedDict()
+fetch_cache_blobs = OrderedDict()
+fetch_cache_parsed = OrderedDict()
+fetch_cache_parsed_sizes = {}
+fetch_cache_parsed_size = 0
+fetch_cache_stats = {"hits": 0, "revalidated": 0, "misses": 0, "bytes_saved": 0, "parsed_hits": 0, "parsed_misses": 0}
+fetch_cache_size = 0
+fetch_cache_lock = Lock()
+
+def normalize_url(url):
+    """Canonical cache key: lowercase scheme/host, no default port or fragment, sorted query"""
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or "").lower()
+    if parsed.port and (scheme, parsed.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parsed.port}"
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return f"{scheme}://{host}{parsed.path or '/'}" + (f"?{query}" if query else "")
+
+def cache_ttl(content_type):
+    if 'html' in content_type:
+        return FETCH_CACHE_TTLS["html"]
+    if 'json' in content_type:
+        return FETCH_CACHE_TTLS["json"]
+    return FETCH_CACHE_TTLS["default"]
+
+def cache_disk_path(name):
+    return os.path.join(FETCH_CACHE_DIR, name)
+
+def cache_store_blob(digest, body):
+    """Keep body in the memory LRU (and on disk when configured), evicting oldest blobs"""
+    global fetch_cache_size
+    dropped = []
+    with fetch_cache_lock:
+        # Spooled bodies arrive as mmap views and only go to the disk tier
+        if digest not in fetch_cache_blobs and isinstance(body, bytes) and len(body) <= FETCH_CACHE_BYTES // 4:
+            fetch_cache_blobs[digest] = body
+            fetch_cache_size += len(body)
+            while fetch_cache_size > FETCH_CACHE_BYTES and fetch_cache_blobs:
+                old_digest, old_body = fetch_cache_blobs.popitem(last=False)
+                fetch_cache_size -= len(old_body)
+                for key in [k for k in fetch_cache_parsed if k[0] == old_digest]:
+                    dropped.append(drop_parsed(key))
+        elif digest in fetch_cache_blobs:
+            fetch_cache_blobs.move_to_end(digest)
+    close_parsed(dropped)
+    
+    if FETCH_CACHE_DIR and not os.path.exists(cache_disk_path(digest)):
+        try:
+            os.makedirs(FETCH_CACHE_DIR, exist_ok=True)
+            tmp = cache_disk_path(f".{digest}.{uuid.uuid4().hex[:6]}")
+            with open(tmp, 'wb') as f:
+                f.write(body)
+            os.replace(tmp, cache_disk_path(digest))
+            prune_disk_cache()
+        except Exception as e:
+            logger.warning(f"⚠️ Disk cache write failed: {e}")
+
+def prune_disk_cache():
+    """Delete the least recently written blobs once the disk tier is over budget"""
+    entries = []
+    for entry in os.scandir(FETCH_CACHE_DIR):
+        if entry.is_file() and not entry.name.endswith('.json'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= FETCH_CACHE_DISK_BYTES:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def cache_load_blob(digest):
+    with fetch_cache_lock:
+        body = fetch_cache_blobs.get(digest)
+        if body is not None:
+            fetch_cache_blobs.move_to_end(digest)
+            return body
+    if FETCH_CACHE_DIR:
+        try:
+            with open(cache_disk_path(digest), 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+        cache_store_blob(digest, body)
+        return body
+    return None
+
+def cache_lookup(key):
+    with fetch_cache_lock:
+        meta = fetch_cache_index.get(key)
+        if meta:
+            fetch_cache_index.move_to_end(key)
+            return dict(meta)
+    if FETCH_CACHE_DIR:
+        try:
+            with open(cache_disk_path(hashlib.sha256(key.encode()).hexdigest()[:32] + '.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return None
+
+def cache_remember(key, meta):
+    with fetch_cache_lock:
+        fetch_cache_index[key] = meta
+        fetch_cache_index.move_to_end(key)
+        while len(fetch_cache_index) > FETCH_CACHE_ENTRIES:
+            fetch_cache_index.popitem(last=False)
+    if FETCH_CACHE_DIR:
+        try:
+            with open(cache_disk_path(hashlib.sha256(key.encode()).hexdigest()[:32] + '.json'), 'w') as f:
+                json.dump(meta, f)
+        except OSError as e:
+            logger.warning(f"⚠️ Disk cache write failed: {e}")
+
+def count_cache(field, amount=1):
+    with fetch_cache_lock:
+        fetch_cache_stats[field] += amount
+    if field in ("hits", "revalidated", "misses"):
+        inc_metric("quiz_cache_events_total", amount, cache="fetch", result=field)
+
+class ArtifactTooLarge(Exception):
+    pass
+
+artifact_stats = {"downloads": 0, "spooled": 0, "rejected": 0}
+artifact_lock = Lock()
+
+def count_artifacts(field, amount=1):
+    with artifact_lock:
+        artifact_stats[field] += amount
+
+class Artifact:
+    """A downloaded body held as bytes, or spooled to a named temp file and read back through mmap"""
+    def __init__(self, body=None, spool=None, size=None, digest=None):
+        self.body = body
+        self.spool = spool
+        self.map = None
+        self.size = len(body) if body is not None else size
+        self.digest = digest or (hashlib.sha256(body).hexdigest() if body is not None else None)
+    
+    @classmethod
+    def receive(cls, response, url, limit, deadline=None, budget=None):
+        """Stream a response body, spilling past ARTIFACT_SPOOL_BYTES and refusing past limit.
+
+        Each chunk is charged to budget before it is kept; on failure the charge is given back.
+        """
+        declared = int(response.headers.get("content-length") or 0)
+        if declared > limit:
+            response.close()
+            count_artifacts("rejected")
+            raise ArtifactTooLarge(f"{url} is {declared} bytes, over the {limit} byte download limit")
+        
+        digest = hashlib.sha256()
+        chunks, size, spool = [], 0, None
+        try:
+            for chunk in response.iter_content(ARTIFACT_CHUNK_BYTES):
+                if size + len(chunk) > limit:
+                    count_artifacts("rejected")
+                    raise ArtifactTooLarge(f"{url} exceeded the {limit} byte download limit")
+                if deadline is not None and deadline.expired():
+                    raise DeadlineExceeded(f"download of {url} ran past the time budget")
+                if budget is not None:
+                    budget.charge(len(chunk), url)
+                size += len(chunk)
+                digest.update(chunk)
+                if spool is None and size > ARTIFACT_SPOOL_BYTES:
+                    spool = tempfile.NamedTemporaryFile(dir=ARTIFACT_DIR or None)
+                    spool.writelines(chunks)
+                    chunks = None
+                if spool is not None:
+                    spool.write(chunk)
+                else:
+                    chunks.append(chunk)
+        except BaseException:
+            if budget is not None:
+                budget.release(size)
+            if spool is not None:
+                spool.close()
+            raise
+        finally:
+            response.close()
+        
+        inc_metric("quiz_http_bytes_total", size, kind="download")
+        if spool is None:
+            return cls(b"".join(chunks), digest=digest.hexdigest())
+        spool.flush()
+        count_artifacts("spooled")
+        return cls(spool=spool, size=size, digest=digest.hexdigest())
+    
+    def view(self):
+        """Zero-copy read access: the bytes themselves, or a read-only mmap of the spool file"""
+        if self.body is not None:
+            return self.body
+        if self.map is None:
+            self.map = mmap.mmap(self.spool.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.map
+    
+    @property
+    def source(self):
+        """What a parser can open without copying the body: the bytes, or the spool file's path"""
+        return self.body if self.body is not None else self.spool.name
+    
+    def close(self):
+        self.body = None
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.spool is not None:
+            self.spool.close()
+            self.spool = None
+
+class ArtifactBudget:
+    """Bytes a job (or, as the parent of every job, the process) may hold in downloads.
+
+    Going over fails that download instead of the process; a job's bytes are handed back
+    to its parent when it closes.
+    """
+    def __init__(self, limit, parent=None, scope="job"):
+        self.limit = limit
+        self.parent = parent
+        self.scope = scope
+        self.used = 0
+        self.closed = False
+        self.lock = Lock()
+    
+    def charge(self, size, url):
+        with self.lock:
+            if self.closed:
+                raise ArtifactTooLarge(f"{url} arrived after its {self.scope} finished")
+            if self.used + size > self.limit:
+                count_artifacts("rejected")
+                raise ArtifactTooLarge(f"{url} needs {size} bytes but the {self.scope} has {self.limit - self.used} of its {self.limit} byte artifact budget left")
+            if self.parent is not None:
+                self.parent.charge(size, url)
+            self.used += size
+    
+    def release(self, size):
+        with self.lock:
+            size = min(size, self.used)
+            self.used -= size
+        if self.parent is not None:
+            self.parent.release(size)
+    
+    def close(self):
+        with self.lock:
+            self.closed = True
+        self.release(self.used)
+
+artifact_memory = ArtifactBudget(ARTIFACT_MEMORY_BYTES, scope="process")
+
+def artifact_snapshot():
+    with artifact_lock:
+        stats = dict(artifact_stats)
+    stats["memory_bytes"] = artifact_memory.used
+    return stats
+
+def cached_get(url, kind, headers=None, deadline=None, limit=None, budget=None):
+    """GET through the fetch cache: fresh hits skip the network, stale ones revalidate.
+
+    With limit, the body is streamed into an Artifact (returned alongside body) and
+    anything larger than limit raises ArtifactTooLarge. The Artifact's bytes are
+    charged to budget, cache hits included.
+    """
+    key = normalize_url(url)
+    meta = cache_lookup(key)
+    body = cache_load_blob(meta["hash"]) if meta else None
+    if body is not None and time.time() < meta["expires"]:
+        count_cache("hits")
+        count_cache("bytes_saved", len(body))
+        if budget is not None:
+            budget.charge(len(body), url)
+        return dict(meta, body=body, artifact=Artifact(body, digest=meta["hash"]), cached=True)
+    
+    headers = dict(headers or {})
+    if body is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    
+    response = http_request("GET", url, kind, deadline, headers=headers, stream=limit is not None)
+    if response.status_code == 304 and body is not None:
+        response.close()
+        meta["expires"] = time.time() + cache_ttl(meta["content_type"])
+        cache_remember(key, meta)
+        count_cache("revalidated")
+        count_cache("bytes_saved", len(body))
+        if budget is not None:
+            budget.charge(len(body), url)
+        return dict(meta, body=body, artifact=Artifact(body, digest=meta["hash"]), cached=True)
+    if not response.ok:
+        response.close()
+    response.raise_for_status()
+    
+    if limit is not None:
+        artifact = Artifact.receive(response, url, limit, deadline, budget)
+        count_artifacts("downloads")
+    else:
+        artifact = Artifact(response.content)
+    body = artifact.view()
+    content_type = response.headers.get('content-type', '').lower()
+    meta = {
+        "hash": artifact.digest,
+        "url": response.url,
+        "content_type": content_type,
+        # A streamed body has already been consumed, so there is nothing left to sniff
+        "encoding": response.encoding or (response.apparent_encoding if limit is None else None) or 'utf-8',
+        "etag": response.headers.get('etag'),
+        "last_modified": response.headers.get('last-modified'),
+        "expires": time.time() + cache_ttl(content_type),
+    }
+    count_cache("misses")
+    cache_store_blob(meta["hash"], body)
+    cache_remember(key, meta)
+    return dict(meta, body=body, artifact=artifact, cached=False)
+
+def parsed_size(value):
+    """Rough bytes held by a parsed form: containers walked, SQLite databases by their pages"""
+    total, stack, seen = 0, [value], set()
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, sqlite3.Connection):
+            try:
+                total += item.execute("PRAGMA page_count").fetchone()[0] * item.execute("PRAGMA page_size").fetchone()[0]
+            except sqlite3.Error:
+                pass
+            continue
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set)):
+            stack.extend(item)
+    return total
+
+def drop_parsed(key):
+    """Remove a parsed entry and its size (caller holds fetch_cache_lock); returns the value to close"""
+    global fetch_cache_parsed_size
+    fetch_cache_parsed_size -= fetch_cache_parsed_sizes.pop(key, 0)
+    return fetch_cache_parsed.pop(key)
+
+def close_parsed(values):
+    """Close the SQLite databases of evicted entries, waiting out any query running on them"""
+    for value in values:
+        if isinstance(value, dict) and isinstance(value.get("db"), sqlite3.Connection):
+            with value["lock"]:
+                value["db"].close()
+
+def clear_parsed_cache():
+    with fetch_cache_lock:
+        dropped = [drop_parsed(key) for key in list(fetch_cache_parsed)]
+    close_parsed(dropped)
+
+def cached_parse(kind, digest, params, parser):
+    """Memoize a parsed form of content by its hash, so cache hits skip reparsing.
+
+    Bounded by FETCH_CACHE_PARSED entries and FETCH_CACHE_PARSED_BYTES of estimated size;
+    a single result over a quarter of that is returned without being cached.
+    """
+    global fetch_cache_parsed_size
+    if not digest:
+        with span(f"parse_{kind}"):
+            return parser()
+    key = (digest, kind, json.dumps(params, sort_keys=True, default=str))
+    with fetch_cache_lock:
+        if key in fetch_cache_parsed:
+            fetch_cache_parsed.move_to_end(key)
+            fetch_cache_stats["parsed_hits"] += 1
+            return fetch_cache_parsed[key]
+    with span(f"parse_{kind}"):
+        result = parser()
+    size = parsed_size(result)
+    dropped = []
+    with fetch_cache_lock:
+        fetch_cache_stats["parsed_misses"] += 1
+        if key in fetch_cache_parsed:
+            # Another thread parsed the same content meanwhile; keep one copy
+            dropped.append(result)
+            result = fetch_cache_parsed[key]
+        elif size <= FETCH_CACHE_PARSED_BYTES // 4:
+            fetch_cache_parsed[key] = result
+            fetch_cache_parsed_sizes[key] = size
+            fetch_cache_parsed_size += size
+            while fetch_cache_parsed and (len(fetch_cache_parsed) > FETCH_CACHE_PARSED or fetch_cache_parsed_size > FETCH_CACHE_PARSED_BYTES):
+                dropped.append(drop_parsed(next(iter(fetch_cache_parsed))))
+    close_parsed(dropped)
+    return result
+
+def fetch_cache_snapshot():
+    with fetch_cache_lock:
+        stats = dict(fetch_cache_stats)
+        stats["entries"] = len(fetch_cache_index)
+        stats["memory_bytes"] = fetch_cache_size
+        stats["parsed_entries"] = len(fetch_cache_parsed)
+        stats["parsed_bytes"] = fetch_cache_parsed_size
+    lookups = stats["hits"] + stats["revalidated"] + stats["misses"]
+    stats["hit_ratio"] = round((stats["hits"] + stats["revalidated"]) / lookups, 3) if lookups else None
+    return stats
 
-def fetch_page_content(url):
+def decode_body(fetched):
+    return str(fetched["body"], fetched["encoding"], 'replace')
+
+def fetch_page_content(url, deadline=None):
     """Fetch page content"""
     try:
         headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-        return {"content": response.text, "success": True, "url": response.url}
+        fetched = cached_get(url, "page", headers, deadline)
+        return {"content": decode_body(fetched), "success": True, "url": fetched["url"]}
     except Exception as e:
         logger.error(f"Fetch failed {url}: {e}")
         return {"content": "", "success": False, "error": str(e)}
@@ -94,133 +1069,721 @@ def fetch_and_parse_js_secret(page_url, page_content, email=None):
         logger.error(f"JS parsing error: {e}")
         return None
 
-def download_file(url, base_url=None):
-    """Download a file"""
+pdf_pool = None
+pdf_pool_lock = Lock()
+
+def open_pdf(source):
+    """source is the PDF's bytes or the path of a spooled copy.
+
+    The spool is handed over as an open file (pypdf would read a path into memory whole);
+    it closes when the reader is dropped.
+    """
+    return lazy_import("pypdf").PdfReader(open(source, "rb") if isinstance(source, str) else BytesIO(source))
+
+def extract_pdf_pages(source, first, last, deadline):
+    """Extract text for pages [first, last), stopping between pages once deadline passes"""
+    reader = open_pdf(source)
+    pages = []
+    for index in range(first, last):
+        if time.time() > deadline:
+            break
+        started = time.time()
+        try:
+            text = reader.pages[index].extract_text() or ""
+        except Exception as e:
+            text = ""
+            logger.warning(f"⚠️ PDF page {index + 1} failed: {e}")
+        pages.append((index, text, round((time.time() - started) * 1000, 1)))
+    return pages
+
+def get_pdf_pool():
+    """Process pool for large PDFs, created on first use"""
+    global pdf_pool
+    with pdf_pool_lock:
+        if pdf_pool is None:
+            pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return pdf_pool
+
+def reset_pdf_pool(broken):
+    """Drop a pool whose worker died, so the next caller starts a fresh one"""
+    global pdf_pool
+    with pdf_pool_lock:
+        if pdf_pool is broken:
+            pdf_pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def detect_pdf_tables(page_texts):
+    """Find runs of numeric rows in extracted text and summarize them like CSV columns"""
+    tables = []
+    for page_number, text in page_texts:
+        lines = [line.split() for line in text.splitlines()]
+        run = []
+        for i, tokens in enumerate(lines + [[]]):
+            numeric = len(tokens) >= 2 and sum(parse_number(t) is not None for t in tokens) >= 2
+            if numeric and (not run or len(tokens) == len(run[-1])):
+                run.append(tokens)
+                continue
+            if len(run) >= 2:
+                start = i - len(run)
+                header = lines[start - 1] if start > 0 and len(lines[start - 1]) == len(run[0]) else None
+                buffer = StringIO()
+                writer = csv.writer(buffer)
+                if header:
+                    writer.writerow(header)
+                writer.writerows(run)
+                analysis = analyze_csv(buffer.getvalue())
+                if analysis:
+                    tables.append({
+                        "page": page_number,
+                        "rows": analysis["rows"],
+                        "columns": analysis["columns"],
+                        "sum_all": analysis["sum_all"],
+                    })
+            run = [tokens] if numeric else []
+    return tables[:PDF_MAX_TABLES]
+
+def extract_pdf(source, budget=None):
+    """Extract text and numeric tables from a PDF (bytes or a file path) within a page and time budget"""
+    started = time.time()
+    deadline = started + (PDF_TIME_BUDGET if budget is None else budget)
+    page_count = len(open_pdf(source).pages)
+    wanted = min(page_count, PDF_MAX_PAGES)
+    
+    if wanted <= PDF_PARALLEL_MIN_PAGES or PDF_WORKERS < 2:
+        pages = extract_pdf_pages(source, 0, wanted, deadline)
+    else:
+        step = -(-wanted // PDF_WORKERS)
+        ranges = [(first, min(first + step, wanted)) for first in range(0, wanted, step)]
+        pages = []
+        # A worker killed mid-document (OOM, a pathological file) breaks the whole pool:
+        # the unfinished ranges get one more try on a fresh pool
+        for attempt in range(2):
+            pool = get_pdf_pool()
+            futures = {}
+            try:
+                for first, last in ranges:
+                    futures[pool.submit(extract_pdf_pages, source, first, last, deadline)] = (first, last)
+                for future in as_completed(futures, timeout=max(deadline - time.time(), 0) + 1):
+                    pages.extend(future.result())
+                    ranges.remove(futures[future])
+                break
+            except FuturesTimeout:
+                logger.warning(f"⏱️ PDF budget spent, keeping {len(pages)} pages")
+                for future in futures:
+                    future.cancel()
+                break
+            except BrokenProcessPool:
+                reset_pdf_pool(pool)
+                if attempt:
+                    raise
+                logger.warning(f"⚠️ PDF worker died, retrying {len(ranges)} page ranges on a fresh pool")
+        pages.sort()
+    
+    text = "\n".join(page_text for _, page_text, _ in pages)
+    tables = detect_pdf_tables([(index + 1, page_text) for index, page_text, _ in pages])
+    return {
+        "text": text,
+        "pages": page_count,
+        "pages_extracted": len(pages),
+        "truncated": len(pages) < page_count,
+        "page_ms": [ms for _, _, ms in pages],
+        "tables": tables,
+        "ms": round((time.time() - started) * 1000, 1),
+    }
+
+def download_file(url, base_url=None, deadline=None, budget=None):
+    """Download a file, charging what it keeps to budget"""
+    artifact, held = None, 0
     try:
         if base_url and not url.startswith(('http://', 'https://')):
             url = urljoin(base_url, url)
         
         logger.info(f"Downloading: {url}")
         headers = {"User-Agent": "Mozilla/5.0"}
-        response = requests.get(url, headers=headers, timeout=60)
-        response.raise_for_status()
+        with span("download", url=url) as attrs:
+            fetched = cached_get(url, "download", headers, deadline, limit=ARTIFACT_MAX_BYTES, budget=budget)
+            attrs.update(bytes=len(fetched["body"]), cached=fetched["cached"])
         
-        content_type = response.headers.get('content-type', '').lower()
+        artifact = fetched["artifact"]
+        held = artifact.size if budget is not None else 0
+        content_type = fetched["content_type"]
+        digest = fetched["hash"]
         
         if any(t in content_type for t in ['text', 'csv', 'json', 'html', 'xml', 'sql']):
-            return {"success": True, "content": response.text, "type": "text", "url": url, "content_type": content_type}
+            # The charge for the raw bytes stands for the decoded text that replaces them
+            content = decode_body(fetched)
+            artifact.close()
+            return {"success": True, "content": content, "type": "text", "url": url, "content_type": content_type, "hash": digest}
         elif 'pdf' in content_type:
-            # For PDF, try to extract text using simple method
             try:
-                import PyPDF2
-                from io import BytesIO
-                pdf_reader = PyPDF2.PdfReader(BytesIO(response.content))
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text()
-                logger.info(f"📄 Extracted {len(text)} chars from PDF")
-                return {"success": True, "content": text, "type": "text", "url": url, "content_type": "text/plain"}
-            except:
-                # Fallback: return base64
-                logger.warning("⚠️ Could not extract PDF text, returning base64")
-                return {"success": True, "content": base64.b64encode(response.content).decode(), "type": "binary", "url": url, "content_type": content_type}
-        else:
-            return {"success": True, "content": base64.b64encode(response.content).decode(), "type": "binary", "url": url, "content_type": content_type}
+                # pypdf reads a spooled PDF from its file, and pool workers open it by path
+                source = artifact.source
+                if deadline is not None and deadline.remaining() < PDF_TIME_BUDGET:
+                    # A deadline-truncated extraction must not be cached as the document's text
+                    pdf = extract_pdf(source, deadline.remaining())
+                else:
+                    pdf = cached_parse("pdf", digest, None, lambda: extract_pdf(source))
+                logger.info(f"📄 Extracted {len(pdf['text'])} chars from {pdf['pages_extracted']}/{pdf['pages']} PDF pages, {len(pdf['tables'])} tables in {pdf['ms']:.0f}ms")
+                artifact.close()
+                if budget is not None:
+                    budget.release(held)
+                    held = 0
+                    budget.charge(len(pdf["text"]), url)
+                return {"success": True, "content": pdf["text"], "type": "text", "url": url, "content_type": "text/plain", "hash": digest, "pdf": pdf}
+            except ArtifactTooLarge:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Could not extract PDF text: {e}")
+        
+        # Nothing downstream reads binary bodies, so only the file's type and size are kept
+        artifact.close()
+        if budget is not None:
+            budget.release(held)
+        return {"success": True, "content": "", "type": "binary", "url": url, "content_type": content_type, "hash": digest, "size": artifact.size}
+    except ArtifactTooLarge as e:
+        if artifact is not None:
+            artifact.close()
+        if held:
+            budget.release(held)
+        logger.warning(f"📦 Download refused: {e}")
+        return {"success": False, "error": str(e), "url": url}
     except Exception as e:
+        if artifact is not None:
+            artifact.close()
+        if held:
+            budget.release(held)
         logger.error(f"Download failed: {e}")
         return {"success": False, "error": str(e), "url": url}
 
-def parse_csv_content(content, cutoff=None):
-    """Parse CSV - return BOTH total sum AND filtered sum"""
+def tidy_number(value):
+    """Render integral floats as ints, as the quiz answers expect"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def parse_number(cell):
+    """Float value of a CSV cell, tolerating thousands separators; None if not numeric"""
+    cell = cell.strip()
+    # Text like "item12" is turned away without raising and catching ValueError twice
+    if not CSV_NUMBERISH.fullmatch(cell):
+        return None
     try:
-        for delimiter in [',', ';', '\t', '|']:
+        value = float(cell)
+    except ValueError:
+        if ',' not in cell and ' ' not in cell:
+            return None
+        try:
+            value = float(cell.replace(',', '').replace(' ', ''))
+        except ValueError:
+            return None
+    return value if math.isfinite(value) else None
+
+def sniff_csv_dialect(content):
+    """Pick the delimiter from a bounded sample instead of parsing the file per candidate"""
+    sample = content[:CSV_SNIFF_BYTES]
+    if len(content) > CSV_SNIFF_BYTES and '\n' in sample:
+        sample = sample[:sample.rindex('\n')]
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=',;\t|').delimiter
+    except csv.Error:
+        pass
+    lines = [line for line in sample.splitlines()[:20] if line.strip()]
+    best, best_count = ',', 0
+    for delimiter in [',', ';', '\t', '|']:
+        counts = [line.count(delimiter) for line in lines]
+        if counts and min(counts) > best_count:
+            best, best_count = delimiter, min(counts)
+    return best
+
+def analyze_csv(content, medians=True):
+    """Stream a CSV once into typed per-column arrays and aggregates; medians (a sort per column) on request"""
+    delimiter = sniff_csv_dialect(content)
+    reader = csv.reader(StringIO(content), delimiter=delimiter)
+    
+    first = next(reader, None)
+    if first is None:
+        return None
+    second = next(reader, None)
+    has_header = second is not None and any(
+        parse_number(c) is None and c.strip() for c in first
+    ) and any(parse_number(c) is not None for c in second)
+    
+    names = [c.strip() or f"col{i+1}" for i, c in enumerate(first)] if has_header else []
+    arrays, text_counts, textual = [], [], []
+    row_count = 0
+    
+    def consume_cells(i, cells):
+        for cell in cells:
+            value = parse_number(cell)
+            if value is not None:
+                arrays[i].append(value)
+            elif cell.strip():
+                text_counts[i] += 1
+    
+    def consume_text(i, cells):
+        """A text column's chunk: the regexes pick out the few numeric cells in C"""
+        joined = "\n".join(cells)
+        if joined.count("\n") != len(cells) - 1:
+            # A quoted cell spans lines
+            consume_cells(i, cells)
+            return
+        values = [v for v in map(parse_number, CSV_NUMBERISH_LINE.findall(joined)) if v is not None]
+        arrays[i].extend(values)
+        text_counts[i] += len(cells) - len(CSV_BLANK_LINE.findall(joined)) - len(values)
+    
+    def consume(chunk):
+        widths = set(map(len, chunk))
+        width = max(widths)
+        while len(arrays) < width:
+            arrays.append(array('d'))
+            text_counts.append(0)
+            textual.append(False)
+        if len(widths) > 1:
+            for row in chunk:
+                for i, cell in enumerate(row):
+                    consume_cells(i, (cell,))
+            return
+        for i, cells in enumerate(zip(*chunk)):
+            # A column that already held text would fail the bulk conversion again
+            if textual[i]:
+                consume_text(i, cells)
+                continue
+            # Whole-column conversion runs in C; fall back per cell on text or nan/inf
             try:
-                csv_reader = csv.reader(StringIO(content), delimiter=delimiter)
-                rows = list(csv_reader)
-                if len(rows) > 0 and len(rows[0]) > 1:
-                    break
-            except:
+                values = array('d', map(float, cells))
+            except ValueError:
+                textual[i] = True
+                consume_cells(i, cells)
                 continue
-        
-        all_numbers = []
-        for row in rows:
-            for cell in row:
-                cell = cell.strip()
-                try:
-                    num = float(cell.replace(',', '').replace(' ', ''))
-                    all_numbers.append(num)
-                except:
-                    pass
-        
-        if all_numbers:
-            total_sum = sum(all_numbers)
-            result = {
-                "all_numbers": all_numbers,
-                "total_count": len(all_numbers),
-                "sum_all": int(total_sum) if total_sum == int(total_sum) else total_sum,
-            }
-            
-            if cutoff is not None:
-                numbers_gt = [n for n in all_numbers if n > cutoff]
-                sum_gt = sum(numbers_gt)
-                
-                result.update({
-                    "cutoff": cutoff,
-                    "count_gt": len(numbers_gt),
-                    "sum_gt": int(sum_gt) if sum_gt == int(sum_gt) else sum_gt,
-                })
-                
-                logger.info(f"📊 CSV: Total={result['sum_all']}, >cutoff={result['sum_gt']}")
-            
-            return result
+            # A plain sum is enough to spot nan/inf (an overflow only costs the per-cell path)
+            if math.isfinite(sum(values)):
+                arrays[i].extend(values)
+            else:
+                consume_cells(i, cells)
+    
+    head = [row for row in ([second] if has_header else [first, second]) if row]
+    if head:
+        consume(head)
+        row_count += len(head)
+    while True:
+        chunk = list(islice(reader, CSV_CHUNK_ROWS))
+        if not chunk:
+            break
+        chunk = [row for row in chunk if row]
+        if chunk:
+            consume(chunk)
+            row_count += len(chunk)
+    
+    while len(names) < len(arrays):
+        names.append(f"col{len(names)+1}")
+    
+    columns = []
+    total_sum = 0.0
+    total_count = 0
+    for index, (name, values, text_count) in enumerate(zip(names, arrays, text_counts)):
+        column = {
+            "name": name,
+            "index": index,
+            "type": "number" if values and not text_count else ("mixed" if values else "text"),
+            "count": len(values),
+            "non_numeric": text_count,
+        }
+        if values:
+            column_sum = math.fsum(values)
+            total_sum += column_sum
+            total_count += len(values)
+            column.update({
+                "sum": tidy_number(column_sum),
+                "min": tidy_number(min(values)),
+                "max": tidy_number(max(values)),
+                "mean": column_sum / len(values),
+            })
+        columns.append(column)
+    
+    if not total_count:
         return None
+    
+    analysis = {
+        "delimiter": delimiter,
+        "has_header": has_header,
+        "rows": row_count,
+        "columns": columns,
+        # By position: header names may repeat
+        "arrays": arrays,
+        "total_count": total_count,
+        "sum_all": tidy_number(total_sum),
+    }
+    if medians:
+        add_csv_medians(analysis)
+    return analysis
+
+def add_csv_medians(analysis):
+    """Fill in each numeric column's median; kept on the (possibly cached) analysis for later callers"""
+    for column in analysis["columns"]:
+        if column["count"] and "median" not in column:
+            ordered = sorted(analysis["arrays"][column["index"]])
+            middle = len(ordered) // 2
+            median = ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+            column["median"] = tidy_number(median)
+
+def csv_passing(values, cutoff, op=">"):
+    """Values passing the cutoff, filtered in C by the cutoff's own comparison"""
+    cutoff = float(cutoff)
+    compare = {">": cutoff.__lt__, ">=": cutoff.__le__, "<": cutoff.__gt__, "<=": cutoff.__ge__}[op]
+    return list(filter(compare, values))
+
+def csv_filtered_sum(analysis, cutoff, index=None, op=">"):
+    """(count, sum) of numbers passing cutoff, in the column at index or across all of them"""
+    arrays = [analysis["arrays"][index]] if index is not None else analysis["arrays"]
+    passing = [csv_passing(values, cutoff, op) for values in arrays]
+    return sum(map(len, passing)), tidy_number(math.fsum(chain.from_iterable(passing)))
+
+def parse_csv_content(content, cutoff=None, digest=None, medians=False):
+    """Parse CSV - return BOTH total sum AND filtered sum, plus per-column stats (medians only when asked)"""
+    try:
+        analysis = cached_parse("csv", digest, None, lambda: analyze_csv(content, medians=False))
+        if not analysis:
+            return None
+        if medians:
+            add_csv_medians(analysis)
+        
+        result = dict(analysis)
+        if cutoff is not None:
+            # Filter each column once; the overall figures are built from the same lists
+            passing = [csv_passing(values, cutoff) for values in analysis["arrays"]]
+            result.update({
+                "cutoff": cutoff,
+                "count_gt": sum(map(len, passing)),
+                "sum_gt": tidy_number(math.fsum(chain.from_iterable(passing))),
+            })
+            result["columns"] = [
+                dict(c, count_gt=len(passing[c["index"]]), sum_gt=tidy_number(math.fsum(passing[c["index"]])))
+                if c["count"] else c
+                for c in analysis["columns"]
+            ]
+            logger.info(f"📊 CSV: Total={result['sum_all']}, >cutoff={result['sum_gt']}")
+        
+        return result
     except Exception as e:
         logger.error(f"CSV parse error: {e}")
         return None
 
-def parse_sql_file(content):
-    """Parse SQL file and extract data"""
+SQL_TOKEN = re.compile(
+    r"(?:[^'\"`;#/-]|-(?!-)|/(?!\*)|'[^'\\]*'|`[^`]*`)+"
+    r"|(?P<escaped>'(?:[^'\\]|\\.|'')*')"
+    r'|"(?:[^"\\]|\\.|"")*"'
+    r"|(?P<comment>--[^\n]*|#[^\n]*|/\*.*?\*/)|;|.",
+    re.DOTALL
+)
+SQL_ESCAPES = {'0': '\0', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a', '\\': '\\', "'": "'", '"': '"'}
+SQL_ESCAPE = re.compile(r"\\(.)", re.DOTALL)
+SQL_TABLE_OPTIONS = re.compile(
+    r"\bAUTO_INCREMENT\b(\s*=\s*\d+)?|\bUNSIGNED\b|\bCHARACTER SET\s+\w+|\bCOLLATE\s+\w+|\bCOMMENT\s+'(?:[^']|'')*'"
+    r"|,\s*(UNIQUE\s+|FULLTEXT\s+)?KEY\s+`?\w+`?\s*\([^)]*\)",
+    re.IGNORECASE
+)
+SQL_INSERT_TARGET = re.compile(
+    r"^(?:INSERT|REPLACE)\s+(?:OR\s+\w+\s+)?(?:IGNORE\s+)?INTO\s+([`\"\[]?[\w.]+[`\"\]]?)\s*(\([^)]*\))?\s*VALUES\s*(.*)$",
+    re.IGNORECASE | re.DOTALL
+)
+SQL_READONLY = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+def sqlite_string(token):
+    """Rewrite a MySQL-style quoted string (backslash escapes) as a SQLite literal"""
+    if '\\' not in token:
+        return token
+    inner = token[1:-1].replace("''", "'")
+    inner = SQL_ESCAPE.sub(lambda m: SQL_ESCAPES.get(m.group(1), '\\' + m.group(1)), inner)
+    return "'" + inner.replace("'", "''") + "'"
+
+def iter_sql_statements(content):
+    """Split a dump into statements in one linear pass, respecting quotes and comments"""
+    parts = []
+    for match in SQL_TOKEN.finditer(content):
+        kind = match.lastgroup
+        token = match.group(0)
+        if kind == 'escaped':
+            parts.append(sqlite_string(token))
+        elif kind == 'comment':
+            parts.append(' ')
+        elif token == ';':
+            statement = ''.join(parts).strip()
+            if statement:
+                yield statement
+            parts = []
+        else:
+            parts.append(token)
+    statement = ''.join(parts).strip()
+    if statement:
+        yield statement
+
+def sql_quote(name):
+    return '"' + name.strip('`"[] ').replace('"', '""') + '"'
+
+def execute_sql_statement(db, statement):
+    """Run one CREATE TABLE / INSERT, adapting MySQL syntax and creating missing tables"""
+    head = statement[:16].upper()
+    if head.startswith('CREATE TABLE'):
+        try:
+            db.execute(statement)
+        except sqlite3.Error:
+            cleaned = SQL_TABLE_OPTIONS.sub('', statement)
+            cleaned = cleaned[:cleaned.rindex(')') + 1]
+            db.execute(cleaned)
+        return True
+    if not head.startswith(('INSERT', 'REPLACE')):
+        return False
     try:
-        # Look for INSERT statements
-        inserts = re.findall(r"INSERT INTO.*?VALUES\s*\((.*?)\)", content, re.IGNORECASE | re.DOTALL)
-        
-        data = []
-        for insert in inserts:
-            # Parse values
-            values = re.findall(r"'([^']*)'|(\d+)", insert)
-            row = [v[0] if v[0] else v[1] for v in values]
-            data.append(row)
-        
-        logger.info(f"📊 SQL: Parsed {len(data)} rows")
-        return {"rows": data, "count": len(data)}
+        db.execute(statement)
+    except sqlite3.OperationalError as e:
+        target = SQL_INSERT_TARGET.match(statement)
+        if 'no such table' not in str(e) or not target:
+            raise
+        table, columns, values = target.groups()
+        if columns:
+            names = columns.strip('()').split(',')
+        else:
+            width = len(db.execute(f"SELECT * FROM (VALUES {values}) LIMIT 0").description)
+            names = [f"c{i+1}" for i in range(width)]
+        db.execute(f"CREATE TABLE {sql_quote(table)} ({', '.join(sql_quote(n) for n in names)})")
+        db.execute(statement)
+    return True
+
+def profile_sql_database(db):
+    """Row counts and per-column numeric aggregates for every table"""
+    tables = {}
+    for (name,) in db.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY rowid").fetchall():
+        table = sql_quote(name)
+        columns = [row[1] for row in db.execute(f"PRAGMA table_info({table})").fetchall()]
+        selects = ["COUNT(*)"]
+        for column in columns:
+            quoted = sql_quote(column)
+            numeric = f"CASE WHEN typeof({quoted}) IN ('integer', 'real') THEN {quoted} END"
+            selects += [f"COUNT({numeric})", f"TOTAL({numeric})", f"MIN({numeric})", f"MAX({numeric})"]
+        row = db.execute(f"SELECT {', '.join(selects)} FROM {table}").fetchone()
+        stats = []
+        for i, column in enumerate(columns):
+            numeric_count, total, low, high = row[1 + i * 4: 5 + i * 4]
+            column_stats = {"name": column, "count": numeric_count}
+            if numeric_count:
+                column_stats.update({"sum": tidy_number(total), "min": low, "max": high, "mean": total / numeric_count})
+            stats.append(column_stats)
+        tables[name] = {
+            "rows": row[0],
+            "columns": stats,
+            "preview": db.execute(f"SELECT * FROM {table} LIMIT 5").fetchall(),
+        }
+    return tables
+
+def load_sql_dump(content):
+    """Execute a dump's CREATE TABLE/INSERT statements into SQLite in batched transactions"""
+    db = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+    executed = skipped = 0
+    db.execute("BEGIN")
+    for statement in iter_sql_statements(content):
+        try:
+            if execute_sql_statement(db, statement):
+                executed += 1
+        except (sqlite3.Error, ValueError) as e:
+            skipped += 1
+            logger.warning(f"⚠️ SQL statement skipped ({e}): {statement[:120]}")
+        if executed and executed % SQL_BATCH_STATEMENTS == 0:
+            db.execute("COMMIT")
+            db.execute("BEGIN")
+    db.execute("COMMIT")
+    return db, skipped
+
+def parse_sql_file(content, digest=None):
+    """Load a SQL dump into an in-memory SQLite database and profile it"""
+    def load():
+        db, skipped = load_sql_dump(content)
+        tables = profile_sql_database(db)
+        data = [list(row) for table in tables.values() for row in table["preview"]]
+        count = sum(table["rows"] for table in tables.values())
+        logger.info(f"📊 SQL: Loaded {count} rows into {len(tables)} tables ({skipped} statements skipped)")
+        # The cached connection is shared by every chain that loads the same dump
+        return {"rows": data, "count": count, "tables": tables, "db": db, "lock": Lock(), "skipped": skipped}
+    
+    try:
+        return cached_parse("sql", digest, None, load)
     except Exception as e:
         logger.error(f"SQL parse error: {e}")
         return None
 
+def run_readonly_query(db, query, lock):
+    """Run a model-proposed SELECT against a loaded dump, bounded in time and rows.
+
+    query_only and the progress handler are connection-wide, so lock (the dump's) is held
+    for the whole query; otherwise a concurrent chain could switch them off mid-query.
+    """
+    query = query.strip().rstrip(';')
+    if not SQL_READONLY.match(query) or ';' in query:
+        return {"query": query, "error": "only single SELECT queries are allowed"}
+    with lock:
+        deadline = time.time() + SQL_QUERY_TIMEOUT
+        db.set_progress_handler(lambda: int(time.time() > deadline), 10000)
+        try:
+            db.execute("PRAGMA query_only = ON")
+            cursor = db.execute(query)
+            columns = [d[0] for d in cursor.description or []]
+            rows = cursor.fetchmany(SQL_QUERY_ROWS)
+            return {"query": query, "columns": columns, "rows": [list(r) for r in rows]}
+        except sqlite3.Error as e:
+            return {"query": query, "error": str(e)}
+        finally:
+            db.set_progress_handler(None, 0)
+            db.execute("PRAGMA query_only = OFF")
+
+HTML_LINK_ATTRS = {"a": "href", "link": "href", "img": "src", "script": "src", "iframe": "src", "embed": "src", "object": "data"}
+HTML_HIDDEN_TAGS = {"script", "style", "template", "noscript"}
+HTML_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+HTML_BLOCK_TAGS = {"p", "div", "br", "tr", "li", "ul", "ol", "table", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article", "pre", "blockquote", "form", "header", "footer"}
+HTML_ID_TEXT_LIMIT = 500
+# Kept separate, each starting with a literal, so the regex engine can scan for the prefix
+BASE64_PAYLOADS = (
+    re.compile(r'atob\(\s*(?:`([^`]+)`|\'([^\']+)\'|"([^"]+)")'),
+    re.compile(r'code\s*=\s*(?:`([A-Za-z0-9+/=\s]+)`|["\']([A-Za-z0-9+/=]+)["\'])'),
+)
+
+class PageExtractor(HTMLParser):
+    """One tokenizer pass over a page collecting id values, visible text, links and tables"""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        self.ids = []
+        self.hidden = 0
+        self.text = []
+        self.values = {}
+        self.links = []
+        self.tables = []
+        self.row = None
+        self.cell = None
+    
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        link = attrs.get(HTML_LINK_ATTRS.get(tag, ""))
+        if link:
+            self.links.append(link)
+        if tag in HTML_BLOCK_TAGS:
+            self.text.append("\n")
+        if tag in ("tr", "td", "th"):
+            # A new row or cell implicitly closes the open cell
+            self.flush_cell()
+        if tag == "table":
+            self.tables.append([])
+        elif tag == "tr" and self.tables:
+            self.row = []
+            self.tables[-1].append(self.row)
+        elif tag in ("td", "th") and self.row is not None:
+            self.cell = []
+        if tag in HTML_VOID_TAGS:
+            return
+        if tag in HTML_HIDDEN_TAGS:
+            self.hidden += 1
+        element_id = attrs.get("id")
+        if element_id:
+            self.ids.append((element_id, []))
+        self.stack.append((tag, bool(element_id)))
+    
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in HTML_VOID_TAGS:
+            self.handle_endtag(tag)
+    
+    def handle_endtag(self, tag):
+        if tag in ("td", "th"):
+            self.flush_cell()
+        elif tag in ("tr", "table"):
+            self.flush_cell()
+            self.row = None
+        if tag in HTML_BLOCK_TAGS:
+            self.text.append("\n")
+        if not any(open_tag == tag for open_tag, _ in self.stack):
+            return
+        # Close tag and whatever was left unclosed inside it
+        while self.stack:
+            open_tag, has_id = self.stack.pop()
+            if open_tag in HTML_HIDDEN_TAGS:
+                self.hidden -= 1
+            if has_id:
+                element_id, parts = self.ids.pop()
+                text = "".join(parts).strip()
+                if text and len(text) < HTML_ID_TEXT_LIMIT:
+                    self.values[f"#{element_id}"] = text
+            if open_tag == tag:
+                break
+    
+    def flush_cell(self):
+        if self.cell is not None and self.row is not None:
+            self.row.append(" ".join("".join(self.cell).split()))
+        self.cell = None
+    
+    def handle_data(self, data):
+        if self.hidden:
+            return
+        self.text.append(data)
+        if self.cell is not None:
+            self.cell.append(data)
+        for _, parts in self.ids:
+            # Stop growing ids that are already too long to be reported
+            if len(parts) < HTML_ID_TEXT_LIMIT:
+                parts.append(data)
+    
+    def result(self):
+        self.close()
+        while self.stack:
+            self.handle_endtag(self.stack[-1][0])
+        lines = (line.strip() for line in "".join(self.text).splitlines())
+        return {
+            "values": self.values,
+            "text": "\n".join(line for line in lines if line),
+            "links": list(dict.fromkeys(self.links)),
+            "tables": [table for table in self.tables if table],
+        }
+
+def decode_base64_payloads(html_content):
+    """Every atob()/code payload on the page that decodes to UTF-8 text, in page order"""
+    payloads = []
+    matches = sorted((m for pattern in BASE64_PAYLOADS for m in pattern.finditer(html_content)), key=lambda m: m.start())
+    for match in matches:
+        if match.re is BASE64_PAYLOADS[1] and html_content[match.start() - 1:match.start()].isalnum():
+            continue
+        encoded = next(group for group in match.groups() if group is not None)
+        try:
+            decoded = base64.b64decode("".join(encoded.split())).decode('utf-8')
+        except (ValueError, UnicodeDecodeError):
+            continue
+        if decoded not in payloads:
+            payloads.append(decoded)
+    return payloads
+
+def page_digest(content):
+    return hashlib.sha256(content.encode('utf-8', 'surrogatepass')).hexdigest()
+
+def page_payloads(content, digest=None):
+    return cached_parse("base64", digest or page_digest(content), None, lambda: decode_base64_payloads(content))
+
+def extract_page(content):
+    """Single-pass extraction of a page, cached by content hash so no page is parsed twice"""
+    digest = page_digest(content)
+    def parse():
+        extractor = PageExtractor()
+        extractor.feed(content)
+        page = extractor.result()
+        page["payloads"] = page_payloads(content, digest)
+        return page
+    return cached_parse("html", digest, None, parse)
+
 def extract_values_from_html(content):
     """Extract values from HTML"""
     try:
-        soup = BeautifulSoup(content, 'html.parser')
-        
-        for tag in soup(["script", "style"]):
-            tag.decompose()
-        
-        values = {}
-        
-        for tag in soup.find_all(id=True):
-            tag_id = tag.get('id')
-            text = tag.get_text().strip()
-            if text and len(text) < 500:
-                values[f"#{tag_id}"] = text
-        
-        text = soup.get_text()
-        lines = [line.strip() for line in text.splitlines() if line.strip()]
-        clean_text = '\n'.join(lines)
-        
+        page = extract_page(content)
         return {
-            "values": values,
-            "text": clean_text,
-            "has_data": len(values) > 0
+            "values": page["values"],
+            "text": page["text"],
+            "links": page["links"],
+            "tables": page["tables"],
+            "has_data": len(page["values"]) > 0
         }
     except Exception as e:
         logger.error(f"HTML parse error: {e}")
@@ -228,23 +1791,12 @@ def extract_values_from_html(content):
 
 def decode_base64_in_page(html_content):
     """Extract and decode base64 from page"""
-    patterns = [
-        r'atob\([`\'"]([^`\'"]+)[`\'"]',
-        r'const code = `([A-Za-z0-9+/=]+)`',
-        r'code = ["\']([A-Za-z0-9+/=]+)["\']',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, html_content)
-        if match:
-            try:
-                decoded = base64.b64decode(match.group(1)).decode('utf-8')
-                logger.info(f"✓ Decoded base64: {decoded[:300]}...")
-                return decoded
-            except:
-                pass
-    
-    return html_content
+    payloads = page_payloads(html_content)
+    if not payloads:
+        return html_content
+    decoded = "\n\n".join(payloads)
+    logger.info(f"✓ Decoded {len(payloads)} base64 payload(s): {decoded[:300]}...")
+    return decoded
 
 def extract_origin_from_page(html_content, page_url):
     """Extract the origin (base URL) from page"""
@@ -252,59 +1804,788 @@ def extract_origin_from_page(html_content, page_url):
     origin = f"{parsed.scheme}://{parsed.netloc}"
     return origin
 
-def solve_with_groq(page_content, quiz_url, downloaded_files=None, previous_attempts=None, email_number=None):
-    """Use Groq AI to solve the quiz"""
-    if not groq_client:
-        logger.error("Groq client not available!")
+llm_cache = OrderedDict()
+llm_cache_stats = {"hits": 0, "misses": 0, "bypassed": 0, "saved_ms": 0.0, "saved_tokens": 0}
+llm_cache_lock = Lock()
+llm_cache_db = None
+
+def llm_cache_key(model, system_prompt, prompt):
+    """Hash of (model, system prompt, whitespace-normalized prompt)"""
+    normalized = re.sub(r'\s+', ' ', prompt).strip()
+    return hashlib.sha256(f"{model}\x00{system_prompt}\x00{normalized}".encode('utf-8')).hexdigest()
+
+def llm_cache_connection():
+    """Open the persistent SQLite tier on first use (caller holds llm_cache_lock)"""
+    global llm_cache_db
+    if llm_cache_db is None and LLM_CACHE_DB:
+        llm_cache_db = sqlite3.connect(LLM_CACHE_DB, check_same_thread=False)
+        llm_cache_db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, response TEXT, expires REAL, latency REAL, tokens INTEGER)"
+        )
+        llm_cache_db.commit()
+    return llm_cache_db
+
+def llm_cache_get(key):
+    with llm_cache_lock:
+        entry = llm_cache.get(key)
+        if entry is None:
+            db = llm_cache_connection()
+            if db is not None:
+                row = db.execute(
+                    "SELECT response, expires, latency, tokens FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row:
+                    entry = {"response": row[0], "expires": row[1], "latency": row[2], "tokens": row[3]}
+                    llm_cache[key] = entry
+        if entry is None:
+            return None
+        if time.time() > entry["expires"]:
+            llm_cache.pop(key, None)
+            return None
+        llm_cache.move_to_end(key)
+        return entry
+
+def llm_cache_put(key, response_text, latency, tokens):
+    entry = {"response": response_text, "expires": time.time() + LLM_CACHE_TTL, "latency": latency, "tokens": tokens}
+    with llm_cache_lock:
+        llm_cache[key] = entry
+        llm_cache.move_to_end(key)
+        while len(llm_cache) > LLM_CACHE_ENTRIES:
+            llm_cache.popitem(last=False)
+        db = llm_cache_connection()
+        if db is not None:
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?)",
+                    (key, response_text, entry["expires"], latency, tokens)
+                )
+                db.execute("DELETE FROM llm_cache WHERE expires < ?", (time.time(),))
+                db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ LLM cache write failed: {e}")
+
+def count_llm_cache(field, amount=1):
+    with llm_cache_lock:
+        llm_cache_stats[field] += amount
+    if field in ("hits", "misses", "bypassed"):
+        inc_metric("quiz_cache_events_total", amount, cache="llm", result=field)
+
+def llm_cache_snapshot():
+    with llm_cache_lock:
+        stats = dict(llm_cache_stats)
+        stats["entries"] = len(llm_cache)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else None
+    stats["saved_ms"] = round(stats["saved_ms"], 1)
+    return stats
+
+def answered_wrong(previous_attempts, quiz_url):
+    """True if this URL already got a wrong answer, so a cached reply would repeat it"""
+    key = normalize_url(quiz_url)
+    return any(
+        normalize_url(a.get("url", "")) == key and not a.get("correct")
+        for a in previous_attempts or []
+    )
+
+def format_column_stats(columns, rows):
+    """Per-column aggregate lines for the prompt"""
+    lines = f"   Columns ({rows} rows):\n"
+    for c in columns:
+        if not c["count"]:
+            lines += f"   - {c['name']} [{c['type']}]\n"
+            continue
+        lines += (
+            f"   - {c['name']} [{c['type']}]: sum={c['sum']}, count={c['count']}, "
+            f"min={c['min']}, max={c['max']}, mean={c['mean']:.4g}"
+        )
+        if "median" in c:
+            lines += f", median={c['median']}"
+        if "sum_gt" in c:
+            lines += f", sum>cutoff={c['sum_gt']} ({c['count_gt']} values)"
+        lines += "\n"
+    return lines
+
+def format_sql_profile(tables):
+    """Table/column summary of a loaded SQL dump for the prompt"""
+    lines = ""
+    for name, table in tables.items():
+        lines += f"   Table {name} ({table['rows']} rows):\n"
+        for c in table["columns"]:
+            lines += f"   - {c['name']}"
+            if c["count"]:
+                lines += f": numeric={c['count']}, sum={c['sum']}, min={c['min']}, max={c['max']}, mean={c['mean']:.4g}"
+            lines += "\n"
+        lines += f"   Preview: {table['preview']}\n"
+    return lines
+
+class JSONProfile:
+    """Bounded-memory profile of a JSON document: schema, numeric aggregates, samples and lookups"""
+    def __init__(self, wanted=()):
+        self.paths = {}
+        self.samples = {}
+        self.lookups = {key: {"found": False, "value": None, "count": 0, "values": []} for key in wanted}
+        # Concrete paths like records[3].value are only spelled out on the way to a wanted one
+        self.prefixes = set(self.lookups)
+        for key in wanted:
+            self.prefixes.update(key[:m.start()] for m in re.finditer(r'[.\[]', key))
+        self.rng = random.Random(0)
+    
+    def stats(self, path):
+        stats = self.paths.get(path)
+        if stats is None and len(self.paths) < JSON_MAX_PATHS:
+            stats = self.paths[path] = {"types": {}}
+        return stats
+    
+    def tally(self, stats, kind, count, lengths=None):
+        if stats is not None:
+            types = stats["types"]
+            types[kind] = types.get(kind, 0) + count
+            if lengths:
+                low, high = min(lengths), max(lengths)
+                stats["min_length"] = min(stats.get("min_length", low), low)
+                stats["max_length"] = max(stats.get("max_length", high), high)
+    
+    def lookup(self, concrete, key, value):
+        entry = self.lookups.get(concrete)
+        if entry is not None:
+            entry.update(found=True, value=value)
+        if key != concrete:
+            self.lookup_key(key, [value])
+    
+    def lookup_key(self, key, values):
+        entry = self.lookups.get(key)
+        if entry is not None:
+            entry["count"] += len(values)
+            entry["values"].extend(values[:JSON_LOOKUP_VALUES - len(entry["values"])])
+    
+    def sample(self, path, index, value):
+        """Keep the first record of an array plus a reservoir over the rest; returns the next index to offer"""
+        sample = self.samples.get(path)
+        if sample is None:
+            if len(self.samples) >= JSON_MAX_PATHS:
+                return math.inf
+            sample = self.samples[path] = {"records": [], "length": 0, "weight": 1.0}
+        records, size = sample["records"], JSON_SAMPLE_RECORDS - 1
+        if len(records) <= size:
+            records.append(value)
+            if len(records) <= size:
+                return index + 1
+        else:
+            records[self.rng.randint(1, size)] = value
+        # Algorithm L: jump straight to the next replaced index instead of drawing per element
+        sample["weight"] *= math.exp(math.log(self.rng.random() or 1e-300) / size)
+        return index + 1 + int(math.log(self.rng.random() or 1e-300) / math.log1p(-sample["weight"]))
+    
+    def observe(self, value, path, concrete, key):
+        """Fold one decoded value into the profile, spelling out concrete paths toward wanted lookups"""
+        if concrete is None:
+            return self.observe_many([value], path, key)
+        self.lookup(concrete, key, value)
+        kind = type(value)
+        if kind is dict:
+            self.tally(self.stats(path), "object", 1, [len(value)])
+            prefix, concrete_prefix = (path + "." if path else ""), (concrete + "." if concrete else "")
+            for k, v in value.items():
+                child = concrete_prefix + k
+                self.observe(v, prefix + k, child if child in self.prefixes else None, k)
+        elif kind is list:
+            self.tally(self.stats(path), "array", 1, [len(value)])
+            for i, v in enumerate(value):
+                child = f"{concrete}[{i}]"
+                self.observe(v, path + "[*]", child if child in self.prefixes else None, None)
+        else:
+            self.observe_many([value], path, None)
+    
+    def observe_many(self, values, path, key):
+        """Fold a column of decoded values sharing one path into the profile in bulk"""
+        if not values:
+            return
+        if key is not None:
+            self.lookup_key(key, values)
+        stats = self.stats(path)
+        kinds = set(map(type, values))
+        if len(kinds) == 1:
+            groups = {kinds.pop(): values}
+        else:
+            groups = {}
+            for value in values:
+                groups.setdefault(type(value), []).append(value)
+        for kind, group in groups.items():
+            if kind is dict:
+                self.tally(stats, "object", len(group), list(map(len, group)))
+                prefix = path + "." if path else ""
+                for k in dict.fromkeys(chain.from_iterable(group)):
+                    self.observe_many([v[k] for v in group if k in v], prefix + k, k)
+            elif kind is list:
+                self.tally(stats, "array", len(group), list(map(len, group)))
+                self.observe_many(list(chain.from_iterable(group)), path + "[*]", None)
+            elif kind is str:
+                self.tally(stats, "string", len(group), list(map(len, group)))
+            elif kind is int or kind is float:
+                if stats is None:
+                    continue
+                low, high = min(group), max(group)
+                if "sum" in stats:
+                    stats.update(sum=stats["sum"] + sum(group), min=min(stats["min"], low), max=max(stats["max"], high))
+                else:
+                    stats.update(sum=sum(group), min=low, max=high)
+                self.tally(stats, "number", len(group))
+            else:
+                self.tally(stats, "boolean" if kind is bool else "null", len(group))
+    
+    def walk(self, content, pos, path, concrete, key, depth):
+        """Stream arrays element by element and outer objects key by key; anything else is decoded whole"""
+        pos = JSON_WHITESPACE.match(content, pos).end()
+        opener = content[pos]
+        if opener == '[':
+            return self.walk_array(content, pos, path, concrete, key)
+        if opener != '{' or depth >= JSON_STREAM_DEPTH or concrete in self.lookups or key in self.lookups:
+            value, end = JSON_DECODER.raw_decode(content, pos)
+            self.observe(value, path, concrete, key)
+            return end
+        stats = self.stats(path)
+        pos = JSON_WHITESPACE.match(content, pos + 1).end()
+        count = 0
+        while content[pos] != '}':
+            if count:
+                if content[pos] != ',':
+                    raise ValueError(f"Expecting ',' delimiter at char {pos}")
+                pos = JSON_WHITESPACE.match(content, pos + 1).end()
+            name, pos = json.decoder.scanstring(content, pos + 1)
+            pos = JSON_WHITESPACE.match(content, pos).end()
+            if content[pos] != ':':
+                raise ValueError(f"Expecting ':' delimiter at char {pos}")
+            child = None
+            if concrete is not None:
+                child = f"{concrete}.{name}" if concrete else name
+                child = child if child in self.prefixes else None
+            pos = self.walk(content, pos + 1, f"{path}.{name}" if path else name, child, name, depth + 1)
+            pos = JSON_WHITESPACE.match(content, pos).end()
+            count += 1
+        self.tally(stats, "object", 1, [count])
+        return pos + 1
+    
+    def walk_array(self, content, pos, path, concrete, key):
+        stats = self.stats(path)
+        # An array named in the question is kept whole for its lookup; others are only streamed
+        wanted = [] if concrete in self.lookups or key in self.lookups else None
+        pos = JSON_WHITESPACE.match(content, pos + 1).end()
+        child_path = path + "[*]"
+        batch, count, offer = [], 0, 0
+        while content[pos] != ']':
+            if count:
+                if content[pos] != ',':
+                    raise ValueError(f"Expecting ',' delimiter at char {pos}")
+                pos = JSON_WHITESPACE.match(content, pos + 1).end()
+            value, pos = JSON_DECODER.raw_decode(content, pos)
+            if wanted is not None:
+                wanted.append(value)
+            child = f"{concrete}[{count}]" if concrete is not None else None
+            if child in self.prefixes:
+                self.observe(value, child_path, child, None)
+            else:
+                batch.append(value)
+                if len(batch) >= JSON_BATCH_RECORDS:
+                    self.observe_many(batch, child_path, None)
+                    batch = []
+            if count >= offer:
+                offer = self.sample(path, count, value)
+            pos = JSON_WHITESPACE.match(content, pos).end()
+            count += 1
+        self.observe_many(batch, child_path, None)
+        self.tally(stats, "array", 1, [count])
+        if wanted is not None:
+            self.lookup(concrete, key, wanted)
+        if path in self.samples:
+            self.samples[path]["length"] = count
+        return pos + 1
+
+# The submit instructions quote an example body ({"email": ..., "secret": ..., "url": ..., "answer": ...})
+SUBMIT_PAYLOAD = re.compile(r'\{[^{}]*["\']answer["\']\s*:[^{}]*\}')
+
+def json_question_paths(question):
+    """Quoted keys and dotted/indexed paths like meta.checksum or records[3].value named in the question"""
+    question = SUBMIT_PAYLOAD.sub(' ', re.sub(r'<[^>]+>', ' ', question))
+    quoted = re.findall(r'[`"\']([\w.\[\]-]+)[`"\']', question)
+    dotted = re.findall(r'(?<![\w./])([A-Za-z_]\w*(?:\.[A-Za-z_]\w*|\[\d+\])+)(?![\w/])', question)
+    return sorted(set(quoted + dotted))
+
+def summarize_json(content, wanted=(), digest=None):
+    """Profile a JSON document in one pass without materializing its outer containers"""
+    wanted = sorted(set(wanted))
+    def parse():
+        profile = JSONProfile(wanted)
+        profile.walk(content, 0, "", "" if wanted else None, None, 0)
+        return {"paths": profile.paths, "samples": profile.samples, "lookups": profile.lookups}
+    try:
+        return cached_parse("json", digest, wanted, parse)
+    except (ValueError, IndexError, RecursionError) as e:
+        logger.error(f"JSON parse error: {e}")
         return None
+
+def format_json_summary(summary):
+    """Lookups, per-path schema and aggregates, and sampled records of a JSON document for the prompt"""
+    lines = ""
+    for key, entry in summary["lookups"].items():
+        if entry["found"]:
+            lines += f"   ✅ {key} = {json.dumps(entry['value'], default=str)[:JSON_SAMPLE_CHARS]}\n"
+        elif entry["count"]:
+            lines += f"   ✅ {key} ({entry['count']} found): {json.dumps(entry['values'], default=str)[:JSON_SAMPLE_CHARS]}\n"
+    for path, stats in summary["paths"].items():
+        types = stats["types"]
+        lines += f"   - {path or '$'}: {'/'.join(types)} x{sum(types.values())}"
+        if "number" in types:
+            mean = stats["sum"] / types["number"]
+            lines += f", sum={tidy_number(stats['sum'])}, min={stats['min']}, max={stats['max']}, mean={mean:.4g}"
+        if "max_length" in stats:
+            lines += f", length {stats['min_length']}-{stats['max_length']}"
+        lines += "\n"
+    largest = sorted(summary["samples"].items(), key=lambda item: -item[1]["length"])[:JSON_SAMPLE_ARRAYS]
+    for path, sample in largest:
+        lines += f"   Sample of {path or '$'} ({sample['length']} items): {json.dumps(sample['records'], default=str)[:JSON_SAMPLE_CHARS]}\n"
+    return lines
+
+def estimate_tokens(text):
+    """Rough Llama token count: words split into <=4-char pieces plus punctuation"""
+    return len(PROMPT_TOKEN.findall(text))
+
+def truncate_to_tokens(text, budget):
+    """Longest prefix of text that fits the token budget, "\n..." marker included"""
+    mark = "\n..."
+    keep = budget - estimate_tokens(mark)
+    cut = 0
+    for i, match in enumerate(PROMPT_TOKEN.finditer(text)):
+        if i == keep:
+            cut = match.start()
+        if i == budget:
+            return text[:cut].rstrip() + mark if keep > 0 else ""
+    return text if budget > 0 else ""
+
+def split_snippets(content):
+    """Cut raw content into roughly PROMPT_SNIPPET_TOKENS-sized line groups"""
+    width = PROMPT_SNIPPET_TOKENS * 4
+    snippets, current = [], []
+    size = 0
+    for line in content[:PROMPT_SCAN_CHARS].splitlines():
+        line = line.rstrip()
+        if not line:
+            continue
+        while len(line) > width:
+            if current:
+                snippets.append("\n".join(current))
+                current, size = [], 0
+            snippets.append(line[:width])
+            line = line[width:]
+        if size + len(line) > width and current:
+            snippets.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line)
+    if current:
+        snippets.append("\n".join(current))
+    return snippets
+
+def rank_snippets(question, sources):
+    """Score every snippet by question-term overlap (IDF weighted); returns (score, source, index) best first"""
+    terms = {t for t in PROMPT_TERM.findall(question.lower()) if t not in PROMPT_STOPWORDS}
+    candidates = []
+    doc_freq = {}
+    for s, snippets in enumerate(sources):
+        for i, snippet in enumerate(snippets):
+            present = terms.intersection(PROMPT_TERM.findall(snippet.lower()))
+            candidates.append((s, i, present))
+            for term in present:
+                doc_freq[term] = doc_freq.get(term, 0) + 1
+    
+    total = max(len(candidates), 1)
+    ranked = []
+    for s, i, present in candidates:
+        score = sum(math.log(1 + total / doc_freq[t]) for t in present)
+        if i == 0:
+            score += 0.5
+        ranked.append((score, s, i))
+    ranked.sort(key=lambda r: (-r[0], r[1], r[2]))
+    return ranked
+
+def build_prompt_context(page_content, files, fixed_text, previous_text):
+    """Pack page, computed facts and ranked raw snippets into PROMPT_TOKEN_BUDGET"""
+    header = "\n\n" + "="*60 + "\nDOWNLOADED FILES:\n" + "="*60 + "\n" if files else ""
+    usage = {"fixed": estimate_tokens(fixed_text) + estimate_tokens(header), "previous": estimate_tokens(previous_text)}
+    remaining = PROMPT_TOKEN_BUDGET - usage["fixed"] - usage["previous"]
+    
+    facts = [f"\n{f['header']}\n{f['facts']}" for f in files]
+    facts_tokens = [estimate_tokens(f) for f in facts]
+    # A long page may not crowd out the computed facts entirely
+    reserved = min(sum(facts_tokens), int(max(remaining, 0) * PROMPT_FACTS_SHARE))
+    page = truncate_to_tokens(page_content, remaining - reserved)
+    usage["page"] = estimate_tokens(page)
+    remaining -= usage["page"]
     
-    files_context = ""
-    if downloaded_files:
-        files_context = "\n\n" + "="*60 + "\nDOWNLOADED FILES:\n" + "="*60 + "\n"
+    if sum(facts_tokens) > remaining and facts:
+        share = max(remaining // len(facts), 0)
+        facts = [truncate_to_tokens(f, share) for f in facts]
+        facts_tokens = [estimate_tokens(f) for f in facts]
+    usage["facts"] = sum(facts_tokens)
+    remaining -= usage["facts"]
+    
+    sources = [split_snippets(f["raw"]) if f["raw"] else [] for f in files]
+    chosen = [set() for _ in files]
+    usage["snippets"] = 0
+    gap = estimate_tokens("   ...\n")
+    for score, s, i in rank_snippets(page_content, sources):
+        # Each pick may open a gap marker before it, and the first from a file one after it
+        cost = estimate_tokens(sources[s][i]) + gap + (gap if not chosen[s] else 0)
+        if score <= 0 or cost > remaining:
+            continue
+        chosen[s].add(i)
+        remaining -= cost
+        usage["snippets"] += cost
+    
+    files_context = header
+    for f, fact, snippets, picked in zip(files, facts, sources, chosen):
+        files_context += fact
+        last = -1
+        for i in sorted(picked):
+            if i != last + 1:
+                files_context += "   ...\n"
+            files_context += snippets[i] + "\n"
+            last = i
+        if picked and last != len(snippets) - 1:
+            files_context += "   ...\n"
+    
+    usage["total"] = sum(usage[k] for k in ("fixed", "previous", "page", "facts", "snippets"))
+    logger.info(
+        f"🧮 Prompt ~{usage['total']}/{PROMPT_TOKEN_BUDGET} tokens: page={usage['page']}, facts={usage['facts']}, "
+        f"snippets={usage['snippets']}, previous={usage['previous']}, fixed={usage['fixed']}"
+    )
+    return page, files_context, usage
+
+def describe_file(url, data, email_number, question=""):
+    """Split a downloaded file into computed facts (high priority) and raw content (ranked)"""
+    content = data.get("content", "")
+    content_type = data.get('content_type', '').lower()
+    
+    # CSV files
+    if 'csv' in url.lower() or 'csv' in content_type:
+        csv_data = parse_csv_content(content, cutoff=email_number, digest=data.get("hash"), medians=True)
+        if not csv_data:
+            return {"header": f"📄 {url}", "facts": "", "raw": content}
+        facts = f"   ✅ TOTAL SUM (all numbers): {csv_data['sum_all']}\n"
+        if csv_data.get('cutoff'):
+            facts += f"   Sum > cutoff ({csv_data['cutoff']}): {csv_data['sum_gt']}\n"
+        facts += format_column_stats(csv_data["columns"], csv_data["rows"])
+        return {"header": f"📊 CSV: {url}", "facts": facts, "raw": content}
+    
+    # SQL files
+    if 'sql' in url.lower() or 'sql' in content_type:
+        sql_data = parse_sql_file(content, data.get("hash"))
+        if sql_data and sql_data["tables"]:
+            facts = f"   Rows: {sql_data['count']}\n" + format_sql_profile(sql_data["tables"])
+            return {"header": f"📊 SQL: {url}", "facts": facts, "raw": ""}
+        return {"header": f"📊 SQL: {url}", "facts": "", "raw": content}
+    
+    # JSON files
+    if 'json' in url.lower() or 'json' in content_type:
+        summary = summarize_json(content, json_question_paths(question), data.get("hash"))
+        facts = format_json_summary(summary) if summary else ""
+        return {"header": f"📊 JSON: {url}", "facts": facts, "raw": content}
+    
+    # PDF files
+    if data.get("pdf"):
+        pdf = data["pdf"]
+        facts = ""
+        for table in pdf["tables"]:
+            facts += f"   Table on page {table['page']}: TOTAL SUM {table['sum_all']}\n"
+            facts += format_column_stats(table["columns"], table["rows"])
+        return {"header": f"📄 PDF: {url} ({pdf['pages_extracted']}/{pdf['pages']} pages)", "facts": facts, "raw": content}
+    
+    # HTML/Text
+    facts = ""
+    if 'SECRET FOUND:' in content:
+        secret_match = re.search(r'SECRET FOUND:\s*([^\s\n]+)', content)
+        if secret_match:
+            facts = f"   🔐 SECRET: {secret_match.group(1)}\n"
+    return {"header": f"📄 {url}", "facts": facts, "raw": content}
+
+class JSONFieldStream:
+    """Incrementally parses a streamed top-level JSON object, reporting each field once complete"""
+    KEY = re.compile(r'\s*,?\s*"((?:[^"\\]|\\.)*)"\s*:\s*')
+    DECODER = json.JSONDecoder()
+    
+    def __init__(self, on_field=None, fired=None):
+        self.parts = []
+        self.buffer = ""
+        self.pos = None
+        self.fields = {}
+        self.on_field = on_field
+        self.fired = fired if fired is not None else set()
+    
+    def feed(self, delta):
+        """Add streamed text; True once the fields needed to act are complete"""
+        self.parts.append(delta)
+        self.buffer += delta
+        if self.pos is None:
+            start = self.buffer.find('{')
+            if start < 0:
+                return False
+            self.pos = start + 1
+        while True:
+            match = self.KEY.match(self.buffer, self.pos)
+            if not match:
+                return self.ready()
+            try:
+                value, end = self.DECODER.raw_decode(self.buffer, match.end())
+            except json.JSONDecodeError:
+                return self.ready()
+            if not self.buffer[end:].strip():
+                # A number or literal at the end of the buffer may still be growing
+                return self.ready()
+            name = json.loads(f'"{match.group(1)}"')
+            self.fields[name] = value
+            self.pos = end
+            if self.on_field and name not in self.fired:
+                self.fired.add(name)
+                try:
+                    self.on_field(name, value)
+                except Exception as e:
+                    logger.warning(f"⚠️ Stream field handler failed for {name}: {e}")
+    
+    def ready(self):
+        return all(field in self.fields for field in GROQ_STREAM_STOP_FIELDS)
+    
+    def text(self):
+        return "".join(self.parts)
+
+class TokenBucket:
+    """Refills capacity units per minute; acquire() blocks until enough are available"""
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.time()
+        self.lock = Lock()
+    
+    def refill(self):
+        now = time.time()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, amount):
+        """Seconds until amount is available, reserving it when it already is"""
+        amount = min(amount, self.capacity)
+        with self.lock:
+            self.refill()
+            if self.level >= amount:
+                self.level -= amount
+                return 0.0
+            return (amount - self.level) / self.rate
+    
+    def adjust(self, amount):
+        """Return (negative) or charge (positive) the difference once the real usage is known"""
+        with self.lock:
+            self.refill()
+            self.level = min(self.capacity, self.level - amount)
+
+class LLMGateway:
+    """Shared front door to Groq: rate limits, bounded concurrency, retries, coalescing"""
+    def __init__(self, client_factory):
+        self.client_factory = client_factory
+        self.requests = TokenBucket(GROQ_RPM)
+        self.tokens = TokenBucket(GROQ_TPM)
+        self.slots = BoundedSemaphore(GROQ_CONCURRENCY)
+        self.paused_until = 0.0
+        self.in_flight = {}
+        self.lock = Lock()
+        self.stats = {"calls": 0, "requests": 0, "retries": 0, "rate_limited": 0, "coalesced": 0, "failures": 0, "early_stops": 0, "waited_ms": 0.0}
+    
+    @property
+    def client(self):
+        return self.client_factory()
+    
+    def count(self, field, amount=1):
+        with self.lock:
+            self.stats[field] += amount
+    
+    def snapshot(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self.in_flight)
+        stats["waited_ms"] = round(stats["waited_ms"], 1)
+        return stats
+    
+    def wait(self, seconds, deadline):
+        if seconds <= 0:
+            return
+        if deadline is not None and seconds > deadline.remaining():
+            raise DeadlineExceeded(f"rate limit wait {seconds:.1f}s exceeds time budget")
+        self.count("waited_ms", seconds * 1000)
+        time.sleep(seconds)
+    
+    def admit(self, estimated_tokens, deadline):
+        """Block until the request and token quotas (and any 429 pause) allow another call"""
+        self.wait(self.paused_until - time.time(), deadline)
+        # Retry until a unit is actually reserved: waking up does not mean the capacity is still there
+        for bucket, amount in ((self.requests, 1), (self.tokens, estimated_tokens)):
+            while True:
+                delay = bucket.wait_time(amount)
+                if not delay:
+                    break
+                self.wait(delay, deadline)
+    
+    def complete(self, messages, max_tokens=4096, deadline=None, on_field=None):
+        """Chat completion shared with any identical request already in flight.
+
+        Returns {"text", "tokens", "prompt_tokens", "completion_tokens", "early_stop"}; with streaming on, on_field(name, value)
+        fires as each top-level JSON field of the reply completes.
+        """
+        self.count("calls")
+        key = llm_cache_key(GROQ_MODEL, json.dumps(messages[:-1]), messages[-1]["content"] + f"\x00{max_tokens}")
+        with self.lock:
+            pending = self.in_flight.get(key)
+            if pending is None:
+                pending = {"done": Event(), "response": None, "error": None}
+                self.in_flight[key] = pending
+                owner = True
+            else:
+                owner = False
         
-        for url, data in downloaded_files.items():
-            if not data.get("success"):
-                continue
-            
-            if data.get("type") == "text":
-                content = data.get("content", "")
-                
-                # CSV files
-                if 'csv' in url.lower() or 'csv' in data.get('content_type', '').lower():
-                    csv_data = parse_csv_content(content, cutoff=email_number)
-                    if csv_data:
-                        files_context += f"\n📊 CSV: {url}\n"
-                        files_context += f"   ✅ TOTAL SUM (all numbers): {csv_data['sum_all']}\n"
-                        if csv_data.get('cutoff'):
-                            files_context += f"   Sum > cutoff ({csv_data['cutoff']}): {csv_data['sum_gt']}\n"
+        if not owner:
+            self.count("coalesced")
+            logger.info("🔗 Joining identical in-flight LLM request")
+            if not pending["done"].wait(deadline.remaining() if deadline is not None else None):
+                raise DeadlineExceeded("coalesced LLM request did not finish in time")
+            if pending["error"]:
+                raise pending["error"]
+            return pending["response"]
+        
+        try:
+            pending["response"] = self.send(messages, max_tokens, deadline, on_field)
+            return pending["response"]
+        except Exception as e:
+            pending["error"] = e
+            raise
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+            pending["done"].set()
+    
+    def send(self, messages, max_tokens, deadline, on_field=None):
+        estimated = sum(estimate_tokens(m["content"]) for m in messages) + GROQ_EXPECTED_COMPLETION
+        fired = set()
+        for attempt in range(GROQ_RETRIES + 1):
+            self.admit(estimated, deadline)
+            try:
+                with self.slots:
+                    self.count("requests")
+                    started = time.time()
+                    if GROQ_STREAM:
+                        result = self.stream(messages, max_tokens, deadline, on_field, fired)
                     else:
-                        files_context += f"\n📄 {url}\n{content[:1000]}\n"
-                
-                # SQL files
-                elif 'sql' in url.lower() or 'sql' in data.get('content_type', '').lower():
-                    sql_data = parse_sql_file(content)
-                    files_context += f"\n📊 SQL: {url}\n"
-                    if sql_data:
-                        files_context += f"   Rows: {sql_data['count']}\n"
-                        files_context += f"   Data preview: {sql_data['rows'][:5]}\n"
-                    files_context += f"\n   Full content:\n{content[:2000]}\n"
-                
-                # JSON files
-                elif 'json' in url.lower() or 'json' in data.get('content_type', '').lower():
-                    try:
-                        json_data = json.loads(content)
-                        files_context += f"\n📊 JSON: {url}\n"
-                        files_context += f"   {json.dumps(json_data, indent=2)[:3000]}\n"
-                    except:
-                        files_context += f"\n📄 {url}\n{content[:2000]}\n"
-                
-                # HTML/Text
-                else:
-                    if 'SECRET FOUND:' in content:
-                        secret_match = re.search(r'SECRET FOUND:\s*([^\s\n]+)', content)
-                        if secret_match:
-                            files_context += f"\n🔐 {url}\n   SECRET: {secret_match.group(1)}\n"
-                    files_context += f"\n📄 {url}\n{content[:1500]}\n"
+                        response = self.client.chat.completions.create(
+                            messages=messages,
+                            model=GROQ_MODEL,
+                            temperature=0,
+                            max_tokens=max_tokens,
+                            timeout=deadline.timeout(GROQ_TIMEOUT) if deadline is not None else GROQ_TIMEOUT
+                        )
+                        result = {
+                            "text": response.choices[0].message.content,
+                            "tokens": getattr(response.usage, "total_tokens", 0) or 0,
+                            "prompt_tokens": getattr(response.usage, "prompt_tokens", 0) or 0,
+                            "completion_tokens": getattr(response.usage, "completion_tokens", 0) or 0,
+                            "early_stop": False,
+                        }
+                observe_metric("quiz_llm_request_seconds", time.time() - started, mode="stream" if GROQ_STREAM else "blocking")
+                inc_metric("quiz_llm_tokens_total", result["prompt_tokens"], type="prompt")
+                inc_metric("quiz_llm_tokens_total", result["completion_tokens"], type="completion")
+                self.tokens.adjust((result["tokens"] or estimated) - estimated)
+                return result
+            except (groq.RateLimitError, groq.InternalServerError, groq.APIConnectionError) as e:
+                if attempt == GROQ_RETRIES:
+                    self.count("failures")
+                    raise
+                delay = random.uniform(0, GROQ_BACKOFF * 2 ** attempt)
+                retry_after = self.retry_after(e)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                if isinstance(e, groq.RateLimitError):
+                    self.count("rate_limited")
+                    with self.lock:
+                        self.paused_until = max(self.paused_until, time.time() + delay)
+                self.count("retries")
+                logger.warning(f"🔁 Groq {type(e).__name__}, retry {attempt + 1}/{GROQ_RETRIES} in {delay:.1f}s")
+                self.wait(delay, deadline)
+    
+    def stream(self, messages, max_tokens, deadline, on_field, fired):
+        """Consume a streamed completion, closing it as soon as the answer fields are complete"""
+        stream = self.client.chat.completions.create(
+            messages=messages,
+            model=GROQ_MODEL,
+            temperature=0,
+            max_tokens=max_tokens,
+            stream=True,
+            timeout=deadline.timeout(GROQ_TIMEOUT) if deadline is not None else GROQ_TIMEOUT
+        )
+        parser = JSONFieldStream(on_field, fired)
+        usage = None
+        early_stop = False
+        try:
+            for chunk in stream:
+                usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or getattr(chunk, "usage", None) or usage
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta and parser.feed(delta):
+                    early_stop = True
+                    break
+                if deadline is not None and deadline.expired():
+                    raise DeadlineExceeded("LLM stream ran past the time budget")
+        finally:
+            stream.close()
+        
+        if early_stop:
+            self.count("early_stops")
+            text = json.dumps(parser.fields)
+            logger.info(f"✂️ Stopped LLM stream once {', '.join(GROQ_STREAM_STOP_FIELDS)} were complete")
+        else:
+            text = parser.text()
+        if usage is not None:
+            prompt_tokens, completion_tokens = usage.prompt_tokens or 0, usage.completion_tokens or 0
+        else:
+            prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+            completion_tokens = estimate_tokens(parser.text())
+        return {
+            "text": text,
+            "tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "early_stop": early_stop,
+        }
+    
+    @staticmethod
+    def retry_after(error):
+        response = getattr(error, "response", None)
+        value = response.headers.get("retry-after") if response is not None else None
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+llm_gateway = LLMGateway(get_groq_client)
+
+def solve_with_groq(page_content, quiz_url, downloaded_files=None, previous_attempts=None, email_number=None, hint=None, deadline=None, on_field=None):
+    """Use Groq AI to solve the quiz"""
+    if get_groq_client() is None:
+        logger.error("Groq client not available!")
+        return None
+    if deadline is not None and deadline.expired():
+        logger.warning("⏱️ No time left for an LLM call")
+        return None
+    
+    files = [
+        describe_file(url, data, email_number, page_content)
+        for url, data in (downloaded_files or {}).items()
+        if data.get("success") and data.get("type") == "text"
+    ]
     
     context = ""
     if previous_attempts:
@@ -312,13 +2593,16 @@ def solve_with_groq(page_content, quiz_url, downloaded_files=None, previous_atte
         context = f"\n⚠️ PREVIOUS WRONG:\n"
         context += f"   Answer: {last.get('answer')}\n"
         context += f"   Reason: {last.get('reason')}\n"
+    if hint:
+        context += f"\n💡 LOCAL ESTIMATE ({hint['solver']}, confidence {hint['confidence']:.2f}): {json.dumps(hint['answer'], default=str)}\n"
+        context += f"   How: {hint['reasoning']}\n"
     
-    prompt = f"""Solve this quiz question precisely.
+    template = """Solve this quiz question precisely.
 
 URL: {quiz_url}
 
 PAGE:
-{page_content[:8000]}
+{page}
 
 {files_context}
 
@@ -327,10 +2611,11 @@ PAGE:
 INSTRUCTIONS:
 1. Read the question carefully
 2. For CSV: use TOTAL SUM (all numbers) unless specifically asked for filtered sum
-3. For SQL: count/analyze the data rows shown
+3. For SQL: use the table profile; if it is not enough, put SQLite SELECT queries in sql_queries
 4. For JSON: extract exact values requested
 5. For arrays: return as JSON array like ["item1", "item2"]
 6. For PDF: extract numbers/text from the content shown
+7. file_urls/scrape_urls: list every link the answer depends on, including ones already under DOWNLOADED FILES
 
 Return ONLY valid JSON:
 {{
@@ -338,22 +2623,49 @@ Return ONLY valid JSON:
   "submit_url": "/submit",
   "file_urls": [],
   "scrape_urls": [],
+  "sql_queries": [],
   "answer": <exact value - number, string, array, etc>,
   "reasoning": "explanation"
 }}"""
+    
+    page, files_context, _ = build_prompt_context(
+        page_content, files, template.format(quiz_url=quiz_url, page="", files_context="", context=""), context
+    )
+    prompt = template.format(quiz_url=quiz_url, page=page, files_context=files_context, context=context)
 
+    cache_key = llm_cache_key(GROQ_MODEL, SYSTEM_PROMPT, prompt)
+    bypass = answered_wrong(previous_attempts, quiz_url)
+    cached = None if bypass else llm_cache_get(cache_key)
+    if bypass:
+        count_llm_cache("bypassed")
+    
     try:
-        response = groq_client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": "Extract exact values. Return valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            model="llama-3.3-70b-versatile",
-            temperature=0,
-            max_tokens=4096
-        )
+        if cached:
+            text = cached["response"]
+            result = json.loads(text)
+            count_llm_cache("hits")
+            count_llm_cache("saved_ms", cached["latency"] * 1000)
+            count_llm_cache("saved_tokens", cached["tokens"])
+            logger.info(f"🧠 LLM cache hit (saved {cached['latency']:.1f}s, {cached['tokens']} tokens)")
+            result["_llm"] = {"cached": True, "ms": 0, "saved_ms": round(cached["latency"] * 1000), "tokens": 0}
+            return result
+        
+        llm_start = time.time()
+        with span("llm", prompt_tokens=estimate_tokens(prompt)) as attrs:
+            response = llm_gateway.complete(
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=4096,
+                deadline=deadline,
+                on_field=on_field
+            )
+            attrs["tokens"] = response["tokens"]
+        latency = time.time() - llm_start
+        tokens = response["tokens"]
         
-        text = response.choices[0].message.content.strip()
+        text = response["text"].strip()
         
         if "```json" in text:
             text = text.split("```json")[1].split("```")[0].strip()
@@ -361,6 +2673,10 @@ Return ONLY valid JSON:
             text = text.split("```")[1].split("```")[0].strip()
         
         result = json.loads(text)
+        if not bypass:
+            count_llm_cache("misses")
+        llm_cache_put(cache_key, text, latency, tokens)
+        result["_llm"] = {"cached": False, "ms": round(latency * 1000), "saved_ms": 0, "tokens": tokens}
         return result
     except Exception as e:
         logger.error(f"Groq error: {e}")
@@ -368,33 +2684,448 @@ Return ONLY valid JSON:
             logger.error(f"Response: {text}")
         return None
 
-def process_quiz(start_url):
-    """Process the quiz chain"""
+def scrape_page(scrape_url, user_email=None, deadline=None):
+    """Fetch a page to scrape, decoded and annotated with any JS secret"""
+    logger.info(f"🔍 Scraping: {scrape_url}")
+    with span("scrape", url=scrape_url):
+        scraped = fetch_page_content(scrape_url, deadline)
+    if not scraped["success"]:
+        return scraped
+    
+    scraped_content = decode_base64_in_page(scraped["content"])
+    
+    js_secret = fetch_and_parse_js_secret(scrape_url, scraped["content"], user_email)
+    
+    if js_secret:
+        scraped_content = f"SECRET FOUND: {js_secret}\n\n" + scraped_content
+    
+    return {
+        "success": True,
+        "content": scraped_content,
+        "type": "text",
+        "url": scrape_url,
+        "content_type": "text/html"
+    }
+
+def fetch_linked_content(file_urls, scrape_urls, page_url, user_email=None, deadline=None, budget=None):
+    """Download files and scrape pages concurrently, keeping whatever finishes before deadline"""
+    tasks = {}
+    for file_url in file_urls or []:
+        if file_url:
+            file_url = urljoin(page_url, file_url)
+            if file_url not in tasks:
+                tasks[file_url] = (download_file, (file_url, page_url, deadline, budget))
+    for scrape_url in scrape_urls or []:
+        if scrape_url:
+            if not scrape_url.startswith("http"):
+                scrape_url = urljoin(page_url, scrape_url)
+            if scrape_url not in tasks:
+                tasks[scrape_url] = (scrape_page, (scrape_url, user_email, deadline))
+    
+    downloaded = {}
+    if not tasks:
+        return downloaded
+    
+    fetch_start = time.time()
+    pool = ThreadPoolExecutor(max_workers=min(FETCH_CONCURRENCY, len(tasks)), thread_name_prefix="fetch")
+    futures = {pool.submit(traced(fn), *args): key for key, (fn, args) in tasks.items()}
+    timeout = deadline.remaining() if deadline else None
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            key = futures[future]
+            try:
+                data = future.result()
+            except Exception as e:
+                logger.error(f"Fetch failed {key}: {e}")
+                continue
+            if data.get("success"):
+                downloaded[key] = data
+                logger.info(f"✓ Fetched: {key}")
+    except FuturesTimeout:
+        pending = [key for future, key in futures.items() if not future.done()]
+        logger.warning(f"⏱️ Deadline reached, abandoning {len(pending)} fetches: {pending}")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    logger.info(f"📦 Fetched {len(downloaded)}/{len(tasks)} in {time.time() - fetch_start:.1f}s")
+    return downloaded
+
+prefetch_pool = ThreadPoolExecutor(max_workers=max(QUIZ_WORKERS, 1) * 2, thread_name_prefix="prefetch")
+prefetch_stats = {"questions": 0, "hits": 0, "misses": 0, "single_round": 0}
+prefetch_stats_lock = Lock()
+
+def find_prefetch_links(page_content, page_url):
+    """Guess which files and same-origin pages a question will need"""
+    try:
+        links = list(extract_page(page_content)["links"])
+    except Exception as e:
+        logger.error(f"Prefetch link scan failed: {e}")
+        links = []
+    links += re.findall(r'https?://[^\s"\'<>`]+', page_content)
+    
+    origin = urlparse(page_url).netloc
+    files, scrapes = [], []
+    for link in links:
+        if not link or link.startswith(('#', 'javascript:', 'mailto:', 'data:')):
+            continue
+        url = urljoin(page_url, link.strip())
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https') or url == page_url:
+            continue
+        if parsed.path.lower().endswith(PREFETCH_EXTENSIONS):
+            if url not in files:
+                files.append(url)
+        elif parsed.netloc == origin and 'submit' not in parsed.path.lower():
+            if url not in scrapes:
+                scrapes.append(url)
+    
+    files = files[:PREFETCH_MAX_LINKS]
+    scrapes = scrapes[:max(PREFETCH_MAX_LINKS - len(files), 0)]
+    return files, scrapes
+
+def record_prefetch(hits, misses, single_round):
+    with prefetch_stats_lock:
+        prefetch_stats["questions"] += 1
+        prefetch_stats["hits"] += hits
+        prefetch_stats["misses"] += misses
+        prefetch_stats["single_round"] += int(single_round)
+
+def prefetch_stats_snapshot():
+    with prefetch_stats_lock:
+        stats = dict(prefetch_stats)
+    requested = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / requested, 3) if requested else None
+    return stats
+
+def early_fetcher(page_url, skip, user_email, deadline, budget=None):
+    """Stream callback that starts downloading the model's links before its answer finishes"""
+    state = {}
+    def on_field(name, value):
+        if name not in ("file_urls", "scrape_urls") or "future" in state:
+            return
+        state[name] = [urljoin(page_url, u) for u in value if u] if isinstance(value, list) else []
+        if "file_urls" in state and "scrape_urls" in state:
+            files = [u for u in state["file_urls"] if u not in skip]
+            scrapes = [u for u in state["scrape_urls"] if u not in skip]
+            if files or scrapes:
+                logger.info(f"⚡ Fetching {len(files) + len(scrapes)} links named mid-stream")
+                state["future"] = prefetch_pool.submit(
+                    traced(fetch_linked_content), files, scrapes, page_url, user_email, deadline, budget
+                )
+    return on_field, state
+
+def run_sql_queries(downloaded, queries):
+    """Run the model's read-only queries against the SQL dumps it was shown"""
+    if not queries or not isinstance(queries, list):
+        return None
+    databases = []
+    for url, data in downloaded.items():
+        if data.get("type") == "text" and ('sql' in url.lower() or 'sql' in data.get('content_type', '').lower()):
+            sql_data = parse_sql_file(data["content"], data.get("hash"))
+            if sql_data and sql_data["tables"]:
+                databases.append((url, sql_data["db"], sql_data["lock"]))
+    if not databases:
+        return None
+    
+    lines = []
+    for query in queries[:5]:
+        for url, db, lock in databases:
+            result = run_readonly_query(db, str(query), lock)
+            if "error" in result and len(databases) > 1:
+                continue
+            lines.append(f"{url}: {json.dumps(result, default=str)}")
+            break
+    logger.info(f"🗄️ Ran {len(lines)} local SQL queries")
+    return {
+        "success": True,
+        "content": "SQL QUERY RESULTS:\n" + "\n".join(lines),
+        "type": "text",
+        "url": "sql-query-results",
+        "content_type": "text/plain"
+    }
+
+LOCAL_SOLVERS = []
+local_solver_stats = {}
+local_solver_lock = Lock()
+
+def local_solver(name, tags):
+    """Register a deterministic solver for questions classified with any of tags"""
+    def register(fn):
+        LOCAL_SOLVERS.append({"name": name, "tags": set(tags), "fn": fn})
+        return fn
+    return register
+
+AGGREGATES = {
+    # "total number of" and "total count" ask for a count, not a sum
+    "sum": re.compile(r'\b(sum|add up|adding)\b|\btotal\b(?!\s+(?:number|count)\b)'),
+    "count": re.compile(r'\b(how many|count|number of)\b'),
+    "mean": re.compile(r'\b(average|mean|avg)\b'),
+    "median": re.compile(r'\bmedian\b'),
+    "max": re.compile(r'\b(max|maximum|highest|largest|greatest|biggest)\b'),
+    "min": re.compile(r'\b(min|minimum|lowest|smallest|least)\b'),
+}
+COMPARISON = re.compile(r'\b(greater|more|less|fewer|above|below|over|under|exceed(?:s|ing)?|at least|at most)\b|[<>]=?')
+CONDITION = re.compile(r'\b(where|whose|which|that (?:have|has|are|is)|(?:have|has|having) (?:a|an)|equal to|equals|only|excluding|except|distinct|unique)\b')
+
+# "the secret code", "what is the secret"; "your secret" in the submit instructions is not a question
+SECRET_ASKED = re.compile(r"\bsecret\s+code\b|\b(?:the|what(?:'s| is))\s+(?:secret|code)\b(?!\s+(?:you|given|provided|from your)\b)")
+
+def other_aggregates(lower, own):
+    """Aggregates other than own that the question asks for"""
+    return [name for name, pattern in AGGREGATES.items() if name != own and pattern.search(lower)]
+
+def classify_question(text):
+    """Cheap keyword tags used to pick which local solvers to try"""
+    lower = text.lower()
+    tags = set()
+    if SECRET_ASKED.search(lower):
+        tags.add("secret")
+    if AGGREGATES["sum"].search(lower):
+        tags.add("sum")
+    if AGGREGATES["count"].search(lower):
+        tags.add("count")
+    if re.search(r'[`"\'][\w.\[\]-]+[`"\']', text):
+        tags.add("key")
+    return tags
+
+def files_of_kind(files, kind):
+    return [
+        (url, data) for url, data in files.items()
+        if data.get("success") and data.get("type") == "text"
+        and (kind in url.lower() or kind in data.get("content_type", "").lower())
+    ]
+
+def mentioned(name, lower):
+    return len(name) > 1 and re.search(r'(?<![\w])' + re.escape(name.lower()) + r'(?![\w])', lower) is not None
+
+def cutoff_filter(lower, email_number):
+    """(op, cutoff) asked for by the question, or None when it asks for a plain sum"""
+    phrases = [
+        (r'greater than or equal to|at least|>=|no less than', ">="),
+        (r'less than or equal to|at most|<=|no more than', "<="),
+        (r'greater than|more than|above|exceed(?:s|ing)?', ">"),
+        (r'less than|below', "<"),
+    ]
+    for pattern, op in phrases:
+        match = re.search(r'(' + pattern + r')\s*(?:the\s+)?(cutoff|-?\d+(?:\.\d+)?)?', lower)
+        if match:
+            target = match.group(2)
+            if target and target != 'cutoff':
+                return op, tidy_number(float(target))
+            if email_number is not None:
+                return op, email_number
+            return None
+    if 'cutoff' in lower and email_number is not None:
+        return ">", email_number
+    return None
+
+@local_solver("secret", tags={"secret"})
+def solve_secret(ctx):
+    for url, data in ctx["files"].items():
+        match = re.search(r'SECRET FOUND:\s*([^\s\n]+)', data.get("content", "") or "")
+        if match:
+            # A guess from the page's script, so the model gets the final say
+            return {"answer": match.group(1), "confidence": 0.8, "reasoning": f"Secret computed for {url}"}
+    if ctx["email"] and re.search(r'sha-?1|emailnumber', ctx["lower"]):
+        return {"answer": compute_secret_from_email(ctx["email"]), "confidence": 0.6, "reasoning": "SHA-1 of email"}
+    return None
+
+@local_solver("csv_sum", tags={"sum"})
+def solve_csv_sum(ctx):
+    csv_files = files_of_kind(ctx["files"], "csv")
+    # Counts, averages and conditions other than a numeric cutoff are the model's job
+    if len(csv_files) != 1 or other_aggregates(ctx["lower"], "sum") or CONDITION.search(ctx["lower"]):
+        return None
+    url, data = csv_files[0]
+    analysis = parse_csv_content(data["content"], digest=data.get("hash"))
+    if not analysis:
+        return None
+    numeric = [c for c in analysis["columns"] if c["type"] == "number"]
+    named = [c for c in analysis["columns"] if c["count"] and analysis["has_header"] and mentioned(c["name"], ctx["lower"])]
+    column = named[0] if len(named) == 1 else (numeric[0] if len(numeric) == 1 else None)
+    confidence = 0.9 if column else 0.6
+    
+    filter_ = cutoff_filter(ctx["lower"], ctx["email_number"])
+    if not filter_ and COMPARISON.search(ctx["lower"]):
+        return None
+    if filter_:
+        op, cutoff = filter_
+        _, total = csv_filtered_sum(analysis, cutoff, column["index"] if column else None, op)
+        return {"answer": total, "confidence": round(confidence - 0.05, 2), "reasoning": f"Sum of {column['name'] if column else 'all numbers'} {op} {cutoff} in {url}"}
+    total = column["sum"] if column else analysis["sum_all"]
+    return {"answer": total, "confidence": confidence, "reasoning": f"Sum of {column['name'] if column else 'all numbers'} in {url}"}
+
+def loaded_sql_tables(ctx):
+    tables = []
+    for url, data in files_of_kind(ctx["files"], "sql"):
+        sql_data = parse_sql_file(data["content"], data.get("hash"))
+        if sql_data:
+            tables += [(name, table) for name, table in sql_data["tables"].items()]
+    return tables
+
+@local_solver("sql_count", tags={"count"})
+def solve_sql_count(ctx):
+    tables = loaded_sql_tables(ctx)
+    named = [(n, t) for n, t in tables if mentioned(n, ctx["lower"])]
+    candidates = named or tables
+    if len(candidates) != 1 or not re.search(r'\b(rows|records|entries)\b', ctx["lower"]) and not named:
+        return None
+    # A filtered count or another aggregate needs a query, not the table's row count
+    if other_aggregates(ctx["lower"], "count") or COMPARISON.search(ctx["lower"]) or CONDITION.search(ctx["lower"]):
+        return None
+    name, table = candidates[0]
+    return {"answer": table["rows"], "confidence": 0.85 if named else 0.75, "reasoning": f"Row count of table {name}"}
+
+@local_solver("sql_sum", tags={"sum"})
+def solve_sql_sum(ctx):
+    matches = [
+        (name, column) for name, table in loaded_sql_tables(ctx)
+        for column in table["columns"] if column["count"] and mentioned(column["name"], ctx["lower"])
+    ]
+    if len(matches) != 1 or other_aggregates(ctx["lower"], "sum") or COMPARISON.search(ctx["lower"]) or CONDITION.search(ctx["lower"]):
+        return None
+    name, column = matches[0]
+    return {"answer": column["sum"], "confidence": 0.85, "reasoning": f"Sum of {name}.{column['name']}"}
+
+@local_solver("json_key", tags={"key"})
+def solve_json_key(ctx):
+    keys = json_question_paths(ctx["question"])
+    candidates = []
+    for url, data in files_of_kind(ctx["files"], "json"):
+        summary = summarize_json(data["content"], keys, data.get("hash"))
+        if not summary:
+            continue
+        for key in keys:
+            entry = summary["lookups"][key]
+            if entry["found"] and entry["value"] is not None and not isinstance(entry["value"], dict):
+                candidates.append((key, entry["value"], 0.85, f"{key} in {url}"))
+            elif entry["count"] == 1 and entry["values"][0] is not None:
+                candidates.append((key, entry["values"][0], 0.8, f"Only {key} in {url}"))
+    if not candidates:
+        return None
+    key, value, confidence, reasoning = candidates[0]
+    # With several named keys resolving, which one is asked for is the model's call
+    if len({(k, json.dumps(v, default=str)) for k, v, _, _ in candidates}) > 1:
+        found = ", ".join(f"{k} = {json.dumps(v, default=str)[:80]}" for k, v, _, _ in candidates)
+        return {"answer": value, "confidence": 0.5, "reasoning": f"Several named keys resolve: {found}"}
+    return {"answer": value, "confidence": confidence, "reasoning": reasoning}
+
+def run_local_solvers(question, files, user_email=None, email_number=None):
+    """Try every matching local solver; returns (best candidate or None, per-solver trace)"""
+    question = SUBMIT_PAYLOAD.sub(' ', re.sub(r'<[^>]+>', ' ', question))
+    tags = classify_question(question)
+    ctx = {
+        "question": question,
+        "lower": question.lower(),
+        "files": files or {},
+        "email": user_email,
+        "email_number": email_number,
+    }
+    best, trace = None, []
+    for solver in LOCAL_SOLVERS:
+        if not solver["tags"] & tags:
+            continue
+        started = time.time()
+        try:
+            outcome = solver["fn"](ctx)
+        except Exception as e:
+            logger.warning(f"⚠️ Local solver {solver['name']} failed: {e}")
+            outcome = None
+        ms = round((time.time() - started) * 1000, 2)
+        trace.append({"solver": solver["name"], "ms": ms, "confidence": outcome["confidence"] if outcome else None})
+        with local_solver_lock:
+            stats = local_solver_stats.setdefault(solver["name"], {"runs": 0, "answers": 0, "used": 0, "ms": 0.0})
+            stats["runs"] += 1
+            stats["ms"] += ms
+            stats["answers"] += int(outcome is not None)
+        if outcome and (best is None or outcome["confidence"] > best["confidence"]):
+            best = dict(outcome, solver=solver["name"])
+    if best:
+        logger.info(f"🧩 Local {best['solver']}: {best['answer']} (confidence {best['confidence']:.2f})")
+    return best, trace
+
+def use_local_answer(best, count=True):
+    """Turn a local answer into a solution, counting it as used unless it is only a fallback"""
+    if count:
+        with local_solver_lock:
+            local_solver_stats[best["solver"]]["used"] += 1
+        logger.info(f"🧩 Skipping LLM, using local {best['solver']} answer")
+    return {
+        "task": f"local:{best['solver']}",
+        "file_urls": [],
+        "scrape_urls": [],
+        "answer": best["answer"],
+        "reasoning": best["reasoning"],
+    }
+
+def local_solver_snapshot():
+    with local_solver_lock:
+        stats = {name: dict(s) for name, s in local_solver_stats.items()}
+    for s in stats.values():
+        s["hit_rate"] = round(s["used"] / s["runs"], 3) if s["runs"] else None
+        s["avg_ms"] = round(s["ms"] / s["runs"], 2) if s["runs"] else None
+        del s["ms"]
+    return stats
+
+def summarize_llm_calls(calls):
+    """Per-question LLM usage, including what the answer cache saved"""
+    calls = [c for c in calls if c]
+    return {
+        "calls": len(calls),
+        "cached": sum(1 for c in calls if c["cached"]),
+        "ms": sum(c["ms"] for c in calls),
+        "saved_ms": sum(c["saved_ms"] for c in calls),
+        "tokens": sum(c["tokens"] for c in calls),
+    }
+
+def process_quiz(start_url, job=None):
+    """Process the quiz chain, reporting progress into job when given"""
     logger.info(f"\n{'#'*70}")
     logger.info(f"🚀 STARTING QUIZ: {start_url}")
     logger.info(f"{'#'*70}\n")
     
     current_url = start_url
-    results = []
+    results = job["results"] if job is not None else []
+    first_question = 0
+    if job is not None and job.get("current_url"):
+        # Checkpointed by a worker that died mid-chain: pick up at its unsolved question
+        current_url = job["current_url"]
+        first_question = job["current_question"] - 1
+        logger.info(f"♻️ Resuming job {job['id']} at question {job['current_question']} with {len(results)} answered")
     start_time = time.time()
-    MAX_TIME = 170
+    http_before = http_stats_snapshot()
+    # The quiz window opened at the POST, not when a worker (or this retry) picked the job up
+    window_start = job["created_at"] if job is not None else start_time
+    chain_deadline = Deadline(0, expires=window_start + CHAIN_TIME_BUDGET)
+    work_deadline = chain_deadline.child(SUBMIT_RESERVE)
+    
+    artifacts = ArtifactBudget(ARTIFACT_JOB_BYTES, artifact_memory)
     
-    for q in range(25):
-        elapsed = time.time() - start_time
-        if elapsed > MAX_TIME:
-            logger.warning(f"⏱️ Time limit ({elapsed:.0f}s)")
+    for q in range(first_question, 25):
+        # The previous question's files are dropped with it
+        artifacts.release(artifacts.used)
+        if chain_deadline.remaining() < MIN_QUESTION_TIME:
+            logger.warning(f"⏱️ Time limit ({time.time() - window_start:.0f}s since the quiz was posted)")
             break
         
         logger.info(f"\n{'='*70}")
         logger.info(f"❓ Question {q+1}: {current_url}")
         logger.info(f"{'='*70}")
         
-        page = fetch_page_content(current_url)
+        if job is not None:
+            job["current_question"] = q + 1
+            job["current_url"] = current_url
+            checkpoint_job(job)
+        
+        start_trace()
+        with span("page_fetch"):
+            page = fetch_page_content(current_url, work_deadline)
         if not page['success']:
             logger.error(f"❌ Failed to fetch")
             break
         
-        content = decode_base64_in_page(page['content'])
+        with span("decode"):
+            content = decode_base64_in_page(page['content'])
         origin = extract_origin_from_page(page['content'], page['url'])
         logger.info(f"📄 Preview: {content[:200]}...")
         
@@ -406,54 +3137,115 @@ def process_quiz(start_url):
                 user_email = email_match.group(1).replace('%40', '@')
                 email_number = compute_email_number(user_email)
         
-        solution = solve_with_groq(content, page['url'], None, results, email_number)
-        if not solution:
-            logger.error("❌ No solution")
-            break
+        prefetch = None
+        prefetch_files, prefetch_scrapes = find_prefetch_links(content, page['url'])
+        if prefetch_files or prefetch_scrapes:
+            logger.info(f"⚡ Prefetching {len(prefetch_files)} files, {len(prefetch_scrapes)} pages")
+            prefetch = prefetch_pool.submit(
+                traced(fetch_linked_content), prefetch_files, prefetch_scrapes,
+                page['url'], user_email, work_deadline, artifacts
+            )
+        
+        prefetched = {}
+        if prefetch:
+            try:
+                with span("prefetch_wait"):
+                    prefetched = prefetch.result(timeout=min(PREFETCH_WAIT, work_deadline.remaining()))
+            except FuturesTimeout:
+                logger.info("⚡ Prefetch still running, asking without files")
+        files_in_prompt = bool(prefetched)
+        
+        on_field, early = early_fetcher(page['url'], set(prefetch_files + prefetch_scrapes), user_email, work_deadline, artifacts)
+        llm_calls = []
+        with span("local_solvers"):
+            local, local_trace = run_local_solvers(content, prefetched, user_email, email_number)
+        local_used = bool(local) and local["confidence"] >= LOCAL_SOLVER_THRESHOLD
+        best_so_far = use_local_answer(local, count=False) if local else None
+        if local_used:
+            solution = use_local_answer(local)
+        else:
+            solution = solve_with_groq(content, page['url'], prefetched or None, results, email_number, hint=local, deadline=work_deadline, on_field=on_field)
+            if not solution:
+                if not best_so_far:
+                    logger.error("❌ No solution")
+                    break
+                logger.warning("⏱️ No LLM answer, submitting best answer so far")
+                solution = best_so_far
+            llm_calls.append(solution.pop("_llm", None))
+        if solution.get("answer") is not None:
+            best_so_far = solution
         
         logger.info(f"📋 Task: {solution.get('task')}")
         
         submit_url = f"{origin}/submit"
         
-        downloaded = {}
-        
-        for file_url in solution.get("file_urls", []):
-            if file_url:
-                data = download_file(file_url, page['url'])
-                if data.get("success"):
-                    downloaded[file_url] = data
-                    logger.info(f"✓ Downloaded: {file_url}")
-        
-        for scrape_url in solution.get("scrape_urls", []):
-            if scrape_url:
-                if not scrape_url.startswith("http"):
-                    scrape_url = urljoin(page['url'], scrape_url)
-                
-                logger.info(f"🔍 Scraping: {scrape_url}")
-                scraped = fetch_page_content(scrape_url)
-                if scraped["success"]:
-                    scraped_content = decode_base64_in_page(scraped["content"])
-                    
-                    js_secret = fetch_and_parse_js_secret(scrape_url, scraped["content"], user_email)
-                    
-                    if js_secret:
-                        scraped_content = f"SECRET FOUND: {js_secret}\n\n" + scraped_content
-                    
-                    downloaded[scrape_url] = {
-                        "success": True,
-                        "content": scraped_content,
-                        "type": "text",
-                        "url": scrape_url,
-                        "content_type": "text/html"
-                    }
-                    logger.info(f"✓ Scraped")
-        
-        if downloaded:
-            logger.info(f"🔄 Re-analyzing with {len(downloaded)} files...")
-            solution = solve_with_groq(content, page["url"], downloaded, results, email_number)
-            if not solution:
-                logger.error("❌ Failed re-analysis")
-                break
+        wanted_files = [urljoin(page['url'], u) for u in solution.get("file_urls", []) if u]
+        wanted_scrapes = [urljoin(page['url'], u) for u in solution.get("scrape_urls", []) if u]
+        # Only hold the submit for a late prefetch that is fetching something the answer needs
+        prefetching = set(prefetch_files + prefetch_scrapes)
+        if prefetch and not files_in_prompt and any(u in prefetching for u in wanted_files + wanted_scrapes):
+            try:
+                with span("prefetch_wait"):
+                    prefetched = prefetch.result(timeout=work_deadline.remaining())
+            except FuturesTimeout:
+                prefetched = {}
+        
+        hits = [u for u in wanted_files + wanted_scrapes if u in prefetched]
+        missing_files = [u for u in wanted_files if u not in prefetched]
+        missing_scrapes = [u for u in wanted_scrapes if u not in prefetched]
+        misses = len(missing_files) + len(missing_scrapes)
+        
+        downloaded = dict(prefetched) if files_in_prompt else {u: prefetched[u] for u in hits}
+        if misses and "future" in early:
+            try:
+                with span("early_fetch_wait"):
+                    downloaded.update(early["future"].result(timeout=work_deadline.remaining()))
+            except FuturesTimeout:
+                pass
+            missing_files = [u for u in missing_files if u not in downloaded]
+            missing_scrapes = [u for u in missing_scrapes if u not in downloaded]
+        if missing_files or missing_scrapes:
+            with span("fetch_links", urls=len(missing_files) + len(missing_scrapes)):
+                downloaded.update(fetch_linked_content(
+                    missing_files, missing_scrapes,
+                    page['url'], user_email, work_deadline, artifacts
+                ))
+        
+        single_round = not misses and (files_in_prompt or not downloaded)
+        record_prefetch(len(hits), misses, single_round)
+        if hits or misses:
+            logger.info(f"⚡ Prefetch: {len(hits)} hits, {misses} misses")
+        
+        if not single_round and downloaded:
+            with span("local_solvers"):
+                local, trace = run_local_solvers(content, downloaded, user_email, email_number)
+            local_trace += trace
+            local_used = bool(local) and local["confidence"] >= LOCAL_SOLVER_THRESHOLD
+            if local_used:
+                solution = use_local_answer(local)
+            elif work_deadline.expired() and best_so_far:
+                logger.warning("⏱️ Budget spent, submitting best answer so far")
+                solution = best_so_far
+            else:
+                logger.info(f"🔄 Re-analyzing with {len(downloaded)} files...")
+                solution = solve_with_groq(content, page["url"], downloaded, results, email_number, hint=local, deadline=work_deadline)
+                if not solution:
+                    if not best_so_far:
+                        logger.error("❌ Failed re-analysis")
+                        break
+                    logger.warning("⏱️ Re-analysis failed, submitting best answer so far")
+                    solution = best_so_far
+                llm_calls.append(solution.pop("_llm", None))
+        
+        with span("sql_queries"):
+            query_results = run_sql_queries(downloaded, solution.get("sql_queries")) if SQL_LOCAL_QUERIES else None
+        if query_results and not work_deadline.expired():
+            logger.info(f"🗄️ Re-analyzing with {len(solution['sql_queries'])} local SQL query results...")
+            downloaded["sql-query-results"] = query_results
+            refined = solve_with_groq(content, page["url"], downloaded, results, email_number, deadline=work_deadline)
+            if refined:
+                llm_calls.append(refined.pop("_llm", None))
+                solution = refined
         
         answer = solution.get("answer")
         logger.info(f"💡 Answer: {answer} (type: {type(answer).__name__})")
@@ -469,7 +3261,8 @@ def process_quiz(start_url):
         logger.info(f"📤 Submitting...")
         
         try:
-            resp = requests.post(submit_url, json=payload, timeout=30)
+            with span("submit"):
+                resp = http_request("POST", submit_url, "submit", chain_deadline, json=payload)
             
             if not resp.text.strip():
                 logger.warning(f"⚠️ Empty response")
@@ -483,14 +3276,26 @@ def process_quiz(start_url):
             
             correct = data.get("correct", False)
             reason = data.get("reason", "")
+            inc_metric("quiz_questions_total", result="correct" if correct else "wrong")
             
             results.append({
                 "question": q+1,
                 "url": current_url,
                 "answer": answer,
                 "correct": correct,
-                "reason": reason
+                "reason": reason,
+                "prefetch": {"hits": len(hits), "misses": misses, "single_round": single_round},
+                "llm": summarize_llm_calls(llm_calls),
+                "local": {
+                    "solver": local["solver"] if local else None,
+                    "confidence": local["confidence"] if local else None,
+                    "used": local_used,
+                    "runs": local_trace
+                }
             })
+            trace = finish_trace()
+            if trace is not None:
+                results[-1]["trace"] = trace
             
             if correct:
                 logger.info(f"✅ CORRECT!")
@@ -516,16 +3321,322 @@ def process_quiz(start_url):
             logger.error(f"❌ Error: {e}")
             break
     
+    artifacts.close()
+    
     correct_count = sum(1 for r in results if r.get("correct"))
     total = len(results)
     pct = (correct_count / total * 100) if total > 0 else 0
     
+    inc_metric("quiz_chains_total")
+    observe_metric("quiz_chain_correct", correct_count, buckets=CHAIN_BUCKETS)
+    
     logger.info(f"\n{'='*70}")
     logger.info(f"📊 FINAL: {correct_count}/{total} ({pct:.1f}%)")
+    
+    http_after = http_stats_snapshot()
+    http_used = {k: http_after[k] - http_before[k] for k in ("requests", "connections", "reused")}
+    http_used["saved_ms"] = round(http_after["saved_ms"] - http_before["saved_ms"], 2)
+    logger.info(f"🔌 HTTP: {http_used['requests']} requests, {http_used['reused']} reused connections (~{http_used['saved_ms']:.0f}ms saved)")
+    if job is not None:
+        job["http"] = http_used
     logger.info(f"{'='*70}\n")
     
     return results
 
+job_queue = queue.Queue(maxsize=QUIZ_QUEUE_DEPTH)
+jobs = {}
+jobs_in_flight = {}
+jobs_lock = Lock()
+workers = []
+
+class JobStore:
+    """SQLite-backed job queue shared by every process on the host, with per-question checkpoints"""
+    SCHEMA = """CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY, url TEXT NOT NULL, status TEXT NOT NULL,
+        created_at REAL NOT NULL, started_at REAL, finished_at REAL, heartbeat REAL,
+        owner TEXT, attempts INTEGER NOT NULL DEFAULT 0,
+        current_question INTEGER, current_url TEXT,
+        results TEXT NOT NULL DEFAULT '[]', http TEXT, error TEXT
+    )"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.local = local()
+        with self.transaction() as db:
+            db.execute(self.SCHEMA)
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+    
+    def connection(self):
+        db = getattr(self.local, "db", None)
+        # A connection opened before a fork (gunicorn --preload) must not be shared with the child
+        if db is None or self.local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db, self.local.pid = db, os.getpid()
+        return db
+    
+    @contextmanager
+    def transaction(self):
+        """Write transaction taken up front, so claims never race between processes"""
+        db = self.connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+    
+    @staticmethod
+    def to_job(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["results"] = json.loads(job["results"])
+        job["http"] = json.loads(job["http"]) if job["http"] else None
+        return job
+    
+    def enqueue(self, url, limit):
+        """Returns (job, created); (None, False) when limit jobs are already queued"""
+        with self.transaction() as db:
+            row = db.execute(
+                "SELECT * FROM jobs WHERE url = ? AND status IN ('queued', 'running')", (url,)
+            ).fetchone()
+            if row:
+                return self.to_job(row), False
+            if db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0] >= limit:
+                return None, False
+            job_id = uuid.uuid4().hex[:12]
+            db.execute(
+                "INSERT INTO jobs (id, url, status, created_at) VALUES (?, ?, 'queued', ?)",
+                (job_id, url, time.time())
+            )
+            return self.to_job(db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()), True
+    
+    def claim(self, owner):
+        """Take the oldest queued job, or a running one whose worker stopped heartbeating"""
+        now = time.time()
+        with self.transaction() as db:
+            while True:
+                row = db.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' OR (status = 'running' AND heartbeat < ?) "
+                    "ORDER BY created_at LIMIT 1", (now - JOB_LEASE,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row["attempts"] >= JOB_MAX_ATTEMPTS:
+                    db.execute(
+                        "UPDATE jobs SET status = 'failed', finished_at = ?, error = ? WHERE id = ?",
+                        (now, f"abandoned after {row['attempts']} attempts", row["id"])
+                    )
+                    continue
+                db.execute(
+                    "UPDATE jobs SET status = 'running', owner = ?, heartbeat = ?, attempts = attempts + 1, "
+                    "started_at = COALESCE(started_at, ?) WHERE id = ?",
+                    (owner, now, now, row["id"])
+                )
+                return self.to_job(db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+    
+    def checkpoint(self, job):
+        with self.transaction() as db:
+            db.execute(
+                "UPDATE jobs SET current_question = ?, current_url = ?, results = ?, heartbeat = ? WHERE id = ?",
+                (job.get("current_question"), job.get("current_url"), json.dumps(job["results"], default=str), time.time(), job["id"])
+            )
+    
+    def finish(self, job):
+        with self.transaction() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, results = ?, http = ?, error = ? WHERE id = ?",
+                (job["status"], job["finished_at"], json.dumps(job["results"], default=str),
+                 json.dumps(job.get("http")), job.get("error"), job["id"])
+            )
+            db.execute(
+                "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE status IN ('done', 'failed') "
+                "ORDER BY finished_at DESC LIMIT -1 OFFSET ?)", (JOB_HISTORY,)
+            )
+    
+    def heartbeat(self, owner):
+        with self.transaction() as db:
+            db.execute("UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status = 'running'", (time.time(), owner))
+    
+    def get(self, job_id):
+        return self.to_job(self.connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+    
+    def list(self):
+        rows = self.connection().execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (JOB_HISTORY + QUIZ_QUEUE_DEPTH,))
+        return [self.to_job(row) for row in rows]
+    
+    def position(self, job):
+        return self.connection().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at <= ?", (job["created_at"],)
+        ).fetchone()[0]
+    
+    def count(self, status):
+        return self.connection().execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+job_store = JobStore(JOB_DB) if JOB_DB else None
+job_wakeup = Event()
+
+def job_owner():
+    # Resolved per call: under gunicorn --preload the pid changes after fork
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def checkpoint_job(job):
+    """Persist the question a job is on, so another worker can resume it there"""
+    if job_store is not None:
+        try:
+            job_store.checkpoint(job)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Checkpoint failed for job {job['id']}: {e}")
+
+def next_job():
+    if job_store is None:
+        return job_queue.get()
+    while True:
+        try:
+            job = job_store.claim(job_owner())
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Job claim failed: {e}")
+            job = None
+        if job:
+            return job
+        job_wakeup.wait(JOB_POLL)
+        job_wakeup.clear()
+
+def job_heartbeat():
+    """Keep this process's running jobs leased while they are being solved"""
+    while True:
+        time.sleep(JOB_LEASE / 3)
+        try:
+            job_store.heartbeat(job_owner())
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Job heartbeat failed: {e}")
+
+
+def job_snapshot(job):
+    """Public view of a job, with queue position and elapsed time"""
+    now = time.time()
+    position = None
+    if job["status"] == "queued" and job_store is not None:
+        position = job_store.position(job)
+    elif job["status"] == "queued":
+        with job_queue.mutex:
+            pending = [j["id"] for j in job_queue.queue]
+        if job["id"] in pending:
+            position = pending.index(job["id"]) + 1
+    started = job.get("started_at")
+    finished = job.get("finished_at")
+    elapsed = ((finished or now) - started) if started else 0
+    return {
+        "id": job["id"],
+        "url": job["url"],
+        "status": job["status"],
+        "queue_position": position,
+        "current_question": job.get("current_question"),
+        "current_url": job.get("current_url"),
+        "elapsed": round(elapsed, 2),
+        "waited": round((started or now) - job["created_at"], 2),
+        "results": list(job["results"]),
+        "error": job.get("error"),
+        "http": job.get("http"),
+    }
+
+def forget_old_jobs():
+    """Drop the oldest finished jobs beyond JOB_HISTORY (caller holds jobs_lock)"""
+    finished = [j for j in jobs.values() if j["status"] in ("done", "failed")]
+    excess = len(finished) - JOB_HISTORY
+    if excess > 0:
+        finished.sort(key=lambda j: j["finished_at"])
+        for j in finished[:excess]:
+            jobs.pop(j["id"], None)
+
+def quiz_worker():
+    """Pull quiz jobs off the queue and run them one at a time"""
+    while True:
+        job = next_job()
+        job["status"] = "running"
+        job["started_at"] = job.get("started_at") or time.time()
+        try:
+            waited = time.time() - job["created_at"]
+            if CHAIN_TIME_BUDGET - waited < MIN_QUESTION_TIME:
+                logger.warning(f"⏱️ Job {job['id']} waited {waited:.0f}s, past its quiz window")
+                job["status"] = "failed"
+                job["error"] = f"quiz window closed after {waited:.0f}s in the queue"
+            else:
+                process_quiz(job["url"], job)
+                job["status"] = "done"
+        except Exception as e:
+            logger.error(f"❌ Job {job['id']} crashed: {e}")
+            job["status"] = "failed"
+            job["error"] = str(e)
+        finally:
+            job["finished_at"] = time.time()
+            if job_store is not None:
+                try:
+                    job_store.finish(job)
+                except sqlite3.Error as e:
+                    logger.error(f"❌ Could not record job {job['id']}: {e}")
+            else:
+                with jobs_lock:
+                    if jobs_in_flight.get(job["url"]) == job["id"]:
+                        del jobs_in_flight[job["url"]]
+                    forget_old_jobs()
+                job_queue.task_done()
+
+def ensure_workers():
+    """Start the worker pool on first use (caller holds jobs_lock)"""
+    if job_store is not None and QUIZ_WORKERS and not workers:
+        Thread(target=job_heartbeat, name="job-heartbeat", daemon=True).start()
+    while len(workers) < QUIZ_WORKERS:
+        worker = Thread(target=quiz_worker, name=f"quiz-worker-{len(workers)+1}", daemon=True)
+        worker.start()
+        workers.append(worker)
+
+def submit_quiz_job(url):
+    """Queue a quiz chain; returns (job, created) or (None, False) when the queue is full"""
+    if job_store is not None:
+        with jobs_lock:
+            ensure_workers()
+        job, created = job_store.enqueue(url, QUIZ_QUEUE_DEPTH)
+        if created:
+            job_wakeup.set()
+        return job, created
+    
+    with jobs_lock:
+        existing = jobs_in_flight.get(url)
+        if existing:
+            return jobs[existing], False
+        
+        ensure_workers()
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "url": url,
+            "status": "queued",
+            "created_at": time.time(),
+            "results": [],
+        }
+        try:
+            job_queue.put_nowait(job)
+        except queue.Full:
+            return None, False
+        
+        jobs[job["id"]] = job
+        jobs_in_flight[url] = job["id"]
+        return job, True
+
+def queue_depth():
+    return job_store.count("queued") if job_store is not None else job_queue.qsize()
+
+@app.before_request
+def start_job_workers():
+    # With a shared job store every process pulls work, not just the one that took the POST
+    if job_store is not None and not workers:
+        with jobs_lock:
+            ensure_workers()
+
 @app.route('/', methods=['POST'])
 def quiz_endpoint():
     try:
@@ -545,9 +3656,181 @@ def quiz_endpoint():
     
     logger.info(f"✓ Quiz request: {url}")
     
-    Thread(target=lambda: process_quiz(url), daemon=True).start()
+    job, created = submit_quiz_job(url)
+    if job is None:
+        logger.warning(f"🚦 Queue full ({QUIZ_QUEUE_DEPTH}), rejecting {url}")
+        resp = jsonify({"error": "Queue full, retry later"})
+        resp.headers["Retry-After"] = "30"
+        return resp, 503
     
-    return jsonify({"status": "accepted"}), 200
+    if not created:
+        logger.info(f"♻️ Already in flight as job {job['id']}")
+        return jsonify({"status": "duplicate", "job_id": job["id"]}), 200
+    
+    return jsonify({"status": "accepted", "job_id": job["id"]}), 200
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    if job_store is not None:
+        snapshot = job_store.list()
+    else:
+        with jobs_lock:
+            snapshot = list(jobs.values())
+    return jsonify({
+        "workers": QUIZ_WORKERS,
+        "queue_depth": queue_depth(),
+        "queue_limit": QUIZ_QUEUE_DEPTH,
+        "jobs": [job_snapshot(j) for j in snapshot]
+    }), 200
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_store.get(job_id) if job_store is not None else jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job_snapshot(job)), 200
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify({
+        "http": http_stats_snapshot(),
+        "http_health": http_health_snapshot(),
+        "startup": startup_snapshot(),
+        "prefetch": prefetch_stats_snapshot(),
+        "fetch_cache": fetch_cache_snapshot(),
+        "llm_cache": llm_cache_snapshot(),
+        "local_solvers": local_solver_snapshot(),
+        "llm_gateway": llm_gateway.snapshot(),
+        "artifacts": artifact_snapshot()
+    }), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    if job_store is not None:
+        running = job_store.count("running")
+    else:
+        with jobs_lock:
+            running = sum(1 for j in jobs.values() if j["status"] == "running")
+    gauges = {
+        "quiz_queue_depth": queue_depth(),
+        "quiz_jobs_running": running,
+        "quiz_llm_in_flight": llm_gateway.snapshot()["in_flight"],
+    }
+    return Response(render_metrics(gauges), mimetype="text/plain; version=0.0.4")
+
+def warm_step(name, fn):
+    """Run one warm-up step once per process image, recording its time or error"""
+    with startup_lock:
+        if name in startup_stats["warmup"]:
+            return
+    started = time.perf_counter()
+    outcome = {}
+    try:
+        fn()
+    except Exception as e:
+        outcome["error"] = str(e)
+        logger.warning(f"⚠️ Warm-up step {name} failed: {e}")
+    outcome["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    with startup_lock:
+        startup_stats["warmup"][name] = outcome
+
+def prime_parsers():
+    """Run each parser once on a tiny input so its regexes and code paths are hot"""
+    payload = base64.b64encode(b'<p>Question: sum the "value" column of <a href="/data.csv">data</a></p>').decode()
+    page = (
+        f'<html><body><div id="result">1</div><table><tr><th>a</th></tr><tr><td>1</td></tr></table>'
+        f'<script>document.querySelector("#result").innerHTML = atob(`{payload}`);</script></body></html>'
+    )
+    extract_values_from_html(page)
+    question = decode_base64_in_page(page) or page
+    classify_question(question)
+    json_question_paths(question)
+    parse_csv_content("id,value\n1,2\n3,4\n")
+    parse_sql_file("CREATE TABLE `t` (`id` int, `value` int);\nINSERT INTO `t` VALUES (1,2),(3,4);")
+    summarize_json('{"records": [{"id": 1, "value": 2}], "meta": {"checksum": 3}}', ["meta.checksum"])
+
+def warm_up():
+    """Fork-safe warm-up: heavy imports, the Groq client and parser caches.
+
+    Opens no sockets or threads, so gunicorn can run it in the master under --preload
+    and every worker inherits the result.
+    """
+    warm_step("groq", get_groq_client)
+    warm_step("pypdf", lambda: lazy_import("pypdf"))
+    warm_step("parsers", prime_parsers)
+
+def prime_connections():
+    """Open keep-alive connections to WARMUP_URLS and Groq so the first quiz skips the handshakes"""
+    for url in WARMUP_URLS:
+        http_request("HEAD", url, "page").close()
+    client = get_groq_client()
+    if WARMUP_GROQ and client is not None and GROQ_API_KEY:
+        client.models.list(timeout=HTTP_CONNECT_TIMEOUT)
+
+def run_warm_up():
+    started = time.perf_counter()
+    warm_up()
+    # Sockets must belong to the process that uses them, so this part always runs after any fork
+    warm_step("connections", prime_connections)
+    with startup_lock:
+        startup_stats["warmup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    warmup_done.set()
+    logger.info(f"🔥 Warm-up done in {startup_stats['warmup_ms']}ms")
+
+def start_warm_up():
+    """Warm this process in the background; /ready goes green when it is done"""
+    global warmup_thread
+    if warmup_thread is not None:
+        return
+    with startup_lock:
+        if warmup_thread is None:
+            warmup_thread = Thread(target=run_warm_up, daemon=True, name="warm-up")
+            warmup_thread.start()
+
+def startup_snapshot():
+    with startup_lock:
+        return dict(startup_stats, ready=warmup_done.is_set(), imports=dict(startup_stats["imports"]), warmup=dict(startup_stats["warmup"]))
+
+def import_profile(limit=15):
+    """Re-import app in a fresh interpreter under -X importtime; slowest modules by cumulative time"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True,
+        env=dict(os.environ, PYTHONWARNINGS="ignore"),
+    )
+    # Children are printed before their parent, so app's direct imports are the depth-1 lines just above it
+    children, total = [], None
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)", line)
+        if not match:
+            continue
+        depth = (len(match.group(3)) - 1) // 2
+        if depth == 1:
+            children.append({"module": match.group(4), "cumulative_ms": int(match.group(2)) / 1000})
+        elif depth == 0 and match.group(4) == "app":
+            total = int(match.group(2)) / 1000
+            break
+        elif depth == 0:
+            children = []
+    return {"total_ms": total, "modules": sorted(children, key=lambda m: -m["cumulative_ms"])[:limit]}
+
+def print_import_profile():
+    profile = import_profile()
+    print(f"import app: {profile['total_ms']:.1f} ms")
+    for m in profile["modules"]:
+        print(f"  {m['cumulative_ms']:8.1f} ms  {m['module']}")
+
+@app.before_request
+def start_request_warm_up():
+    # Covers servers that never call the gunicorn hooks; a no-op once started
+    start_warm_up()
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Unlike /health, green only once this process has finished warming up"""
+    start_warm_up()
+    status = "ready" if warmup_done.is_set() else "warming"
+    return jsonify({"status": status, "startup": startup_snapshot()}), 200 if status == "ready" else 503
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -557,10 +3840,39 @@ def health():
 def test():
     return jsonify({
         "email": EMAIL,
-        "groq_ready": groq_client is not None
+        "groq_ready": get_groq_client() is not None,
+        "groq_error": groq_init_error
     }), 200
 
-if __name__ == '__main__':
+def run_job_worker():
+    with jobs_lock:
+        ensure_workers()
+    for worker in workers:
+        worker.join()
+
+def supervise_job_workers():
+    """Run JOB_PROCESSES worker processes against JOB_DB, restarting any that die"""
+    if job_store is None:
+        sys.exit("JOB_DB must be set to run workers")
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    while True:
+        processes = [p for p in processes if p.is_alive()]
+        while len(processes) < JOB_PROCESSES:
+            process = context.Process(target=run_job_worker, name=f"quiz-jobs-{len(processes)+1}")
+            process.start()
+            logger.info(f"👷 Started job worker process {process.pid}")
+            processes.append(process)
+        time.sleep(5)
+
+startup_stats["import_ms"] = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
+
+if __name__ == '__main__' and sys.argv[1:] == ["worker"]:
+    supervise_job_workers()
+elif __name__ == '__main__' and sys.argv[1:] == ["imports"]:
+    print_import_profile()
+elif __name__ == '__main__':
     port = int(os.environ.get("PORT", 8080))
     logger.info(f"🚀 Starting on port {port}")
+    start_warm_up()
     app.run(host="0.0.0.0", port=port, debug=False, threaded=True)
@@ -0,0 +1,132 @@
+"""Fake Groq chat-completions endpoint with configurable latency, streaming and 429s"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+QUESTION_ID = re.compile(r"Question id: ([\w-]+)")
+SECRET_FACT = re.compile(r"SECRET: (\S+)")
+
+
+class FakeGroq:
+    """Answers from an answer key when given one, otherwise with a fixed reply"""
+    def __init__(self, latency=0.5, jitter=0.2, chunk_delay=0.005, rate_limit_every=0, answer_for=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_delay = chunk_delay
+        self.rate_limit_every = rate_limit_every
+        self.answer_for = answer_for
+        self.calls = 0
+        self.rate_limited = 0
+        self.lock = threading.Lock()
+
+    def reply(self, prompt):
+        match = QUESTION_ID.search(prompt)
+        answer, files = 0, []
+        if match and self.answer_for:
+            question, files = self.answer_for(match.group(1))
+            if question is not None:
+                answer = question.answer
+                if answer == "sha1":
+                    # Like the real model, read the secret off the computed facts when they have it
+                    secret = SECRET_FACT.search(prompt)
+                    answer = secret.group(1) if secret else "see scrape page"
+        return json.dumps({
+            "task": "benchmark question",
+            "submit_url": "/submit",
+            "file_urls": [f for f in files if "scrape" not in f],
+            "scrape_urls": [f for f in files if "scrape" in f],
+            "sql_queries": [],
+            "answer": answer,
+            "reasoning": "looked it up " * 40,
+        })
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def send_json(self, status, payload, headers=()):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                # The app lists models during warm-up to open its connection early
+                if self.path.rstrip("/").endswith("/models"):
+                    return self.send_json(200, {"object": "list", "data": [{"id": "llama-3.3-70b-versatile", "object": "model"}]})
+                self.send_json(404, {"error": {"message": "not found"}})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                with fake.lock:
+                    fake.calls += 1
+                    limited = fake.rate_limit_every and fake.calls % fake.rate_limit_every == 0
+                    if limited:
+                        fake.rate_limited += 1
+                if limited:
+                    return self.send_json(429, {"error": {"message": "rate limited", "type": "rate_limit"}}, [("Retry-After", "1")])
+
+                time.sleep(max(fake.latency + random.uniform(-fake.jitter, fake.jitter), 0))
+                prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+                text = fake.reply(prompt)
+                usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4, "total_tokens": (len(prompt) + len(text)) // 4}
+
+                if not body.get("stream"):
+                    return self.send_json(200, {
+                        "id": "bench", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+                        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+                        "usage": usage,
+                    })
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                try:
+                    for i in range(0, len(text), 16):
+                        chunk = {
+                            "id": "bench", "object": "chat.completion.chunk", "created": int(time.time()), "model": body["model"],
+                            "choices": [{"index": 0, "delta": {"content": text[i:i + 16]}, "finish_reason": None}],
+                        }
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                        self.wfile.flush()
+                        time.sleep(fake.chunk_delay)
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def serve(self, host="127.0.0.1", port=0):
+        """Serve on a background thread; returns (server, base_url) for GROQ_BASE_URL"""
+        server = ThreadingHTTPServer((host, port), self.handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, f"http://{host}:{server.server_port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    args = parser.parse_args()
+    fake = FakeGroq(latency=args.latency, rate_limit_every=args.rate_limit_every)
+    server = ThreadingHTTPServer(("0.0.0.0", args.port), fake.handler())
+    print(f"Fake Groq on http://127.0.0.1:{args.port} (set GROQ_BASE_URL to this)")
+    server.serve_forever()
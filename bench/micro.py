@@ -0,0 +1,102 @@
+"""Micro-benchmarks for the parsers on large generated inputs
+
+    python bench/micro.py --scale 1 --repeat 5
+"""
+import argparse
+import base64
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_csv(rows, rng):
+    lines = ["id,value,price,label"]
+    lines += [f"{i},{rng.randint(-5000, 5000)},{rng.random() * 100:.2f},item{i % 97}" for i in range(rows)]
+    return "\n".join(lines)
+
+
+def make_sql(rows, rng):
+    lines = [
+        "-- generated dump",
+        "CREATE TABLE `sales` (`id` int NOT NULL AUTO_INCREMENT, `region` varchar(20), `amount` decimal(10,2), `note` text, PRIMARY KEY (`id`)) ENGINE=InnoDB;",
+    ]
+    for start in range(0, rows, 1000):
+        values = ",".join(
+            f"({i},'r{i % 7}',{rng.random() * 1000:.2f},'it\\'s row {i}; ok')"
+            for i in range(start, min(start + 1000, rows))
+        )
+        lines.append(f"INSERT INTO `sales` VALUES {values};")
+    return "\n".join(lines)
+
+
+def make_json(records, rng):
+    rows = [{"id": i, "value": rng.randint(1, 1000), "price": round(rng.random() * 100, 2), "tags": ["a", "b"], "meta": {"ok": i % 2 == 0}} for i in range(records)]
+    return json.dumps({"records": rows, "meta": {"checksum": rng.randint(10000, 99999)}})
+
+
+def make_html(elements, rng):
+    parts = ["<html><head><style>.x{color:red}</style><script>var a = 1;</script></head><body>"]
+    for i in range(elements):
+        parts.append(f'<div id="cell{i}"><span>{rng.randint(0, 10 ** 6)}</span></div><p>Paragraph {i} text</p>')
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def make_base64_page(payload_bytes, rng):
+    question = "<p>Question: sum the values.</p>" + "".join(f"<p>row {i}: {rng.randint(0, 99)}</p>" for i in range(payload_bytes // 24))
+    encoded = base64.b64encode(question.encode()).decode()
+    filler = "<div>" + "lorem ipsum " * (payload_bytes // 12) + "</div>"
+    return f"<html><body>{filler}<script>document.querySelector('#result').innerHTML = atob(`{encoded}`);</script></body></html>"
+
+
+def bench(name, fn, size, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    best, median = min(times), statistics.median(times)
+    print(f"{name:<28} {size / 1e6:7.2f} MB  best {best * 1000:9.1f} ms  median {median * 1000:9.1f} ms  {size / 1e6 / best:8.1f} MB/s")
+    return {"name": name, "bytes": size, "best_ms": best * 1000, "median_ms": median * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply input sizes")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import app
+    logging.getLogger(app.__name__).setLevel(logging.WARNING)
+    rng = random.Random(args.seed)
+
+    csv_text = make_csv(int(200000 * args.scale), rng)
+    sql_text = make_sql(int(100000 * args.scale), rng)
+    json_text = make_json(int(100000 * args.scale), rng)
+    html_text = make_html(int(20000 * args.scale), rng)
+    page_text = make_base64_page(int(1000000 * args.scale), rng)
+
+    def uncached(fn, *fn_args, **kwargs):
+        # Every repeat must do the full parse, not hit the parsed-form cache
+        def run():
+            app.clear_parsed_cache()
+            return fn(*fn_args, **kwargs)
+        return run
+
+    bench("parse_csv_content", uncached(app.parse_csv_content, csv_text, cutoff=100), len(csv_text), args.repeat)
+    bench("parse_sql_file", uncached(app.parse_sql_file, sql_text), len(sql_text), args.repeat)
+    bench("summarize_json", uncached(app.summarize_json, json_text, ["meta.checksum", "records[3].value"]), len(json_text), args.repeat)
+    bench("extract_values_from_html", uncached(app.extract_values_from_html, html_text), len(html_text), args.repeat)
+    bench("decode_base64_in_page", uncached(app.decode_base64_in_page, page_text), len(page_text), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
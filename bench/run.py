@@ -0,0 +1,178 @@
+"""End-to-end benchmark: local quiz chains and a fake Groq against a real app process
+
+    python bench/run.py --chains 8 --length 5 --workers 2 --llm-latency 0.5
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from quiz_server import QuizChains, KINDS
+from fake_groq import FakeGroq
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def free_port():
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def peak_rss_kb(pid):
+    """Peak resident set of a running process (Linux), None elsewhere"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+
+def start_app(port, groq_url, args):
+    env = dict(os.environ)
+    env.update({
+        "PORT": str(port),
+        "GROQ_API_KEY": env.get("GROQ_API_KEY") or "bench",
+        "GROQ_BASE_URL": groq_url,
+        "QUIZ_WORKERS": str(args.workers),
+        "QUIZ_QUEUE_DEPTH": str(max(args.chains, 8)),
+        "GROQ_RPM": str(args.groq_rpm),
+        "GROQ_TPM": str(args.groq_tpm),
+    })
+    log = open(args.app_log, "w") if args.app_log else subprocess.DEVNULL
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "app.py")], env=env, stdout=log, stderr=subprocess.STDOUT)
+    base = f"http://127.0.0.1:{port}"
+    started = time.time()
+    for _ in range(300):
+        try:
+            if requests.get(f"{base}/ready", timeout=1).ok:
+                return proc, base, time.time() - started
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("app did not become ready")
+
+
+def run(args):
+    from app import EMAIL, SECRET
+
+    chains = QuizChains(args.chains, args.length, args.rows, tuple(args.kinds.split(",")), args.seed)
+    quiz_server, quiz_url = chains.serve()
+    fake = FakeGroq(latency=args.llm_latency, jitter=args.llm_jitter, rate_limit_every=args.rate_limit_every, answer_for=chains.answer_for)
+    groq_server, groq_url = fake.serve()
+    proc, base, ready_s = start_app(free_port(), groq_url, args)
+
+    try:
+        started = time.time()
+
+        def submit(path):
+            reply = requests.post(base + "/", json={"email": EMAIL, "secret": SECRET, "url": f"{quiz_url}{path}?email={args.email}"}, timeout=10)
+            return reply.json().get("job_id")
+
+        with ThreadPoolExecutor(max_workers=args.chains) as pool:
+            job_ids = [j for j in pool.map(submit, chains.start_paths()) if j]
+
+        pending = set(job_ids)
+        while pending and time.time() - started < args.timeout:
+            for job_id in list(pending):
+                status = requests.get(f"{base}/jobs/{job_id}", timeout=5).json().get("status")
+                if status in ("done", "failed"):
+                    pending.discard(job_id)
+            time.sleep(0.2)
+        elapsed = time.time() - started
+        rss = peak_rss_kb(proc.pid)
+        stats = requests.get(f"{base}/stats", timeout=5).json()
+    finally:
+        proc.terminate()
+        proc.wait()
+        quiz_server.shutdown()
+        groq_server.shutdown()
+    if rss is None:
+        rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+    seconds = sorted(t["seconds"] for t in chains.timings)
+    questions = len(seconds)
+    by_kind = {}
+    for t in chains.timings:
+        by_kind.setdefault(t["kind"], []).append(t["seconds"])
+
+    return {
+        "chains": args.chains,
+        "workers": args.workers,
+        "unfinished_jobs": len(pending),
+        "questions": questions,
+        "correct": sum(1 for t in chains.timings if t["correct"]),
+        "wall_s": round(elapsed, 2),
+        "questions_per_s": round(questions / elapsed, 3) if elapsed else None,
+        "latency_s": {f"p{p}": round(percentile(seconds, p), 3) if seconds else None for p in (50, 95, 99)},
+        "latency_by_kind_s": {k: round(statistics.median(v), 3) for k, v in sorted(by_kind.items())},
+        "peak_rss_mb": round(rss / 1024, 1) if rss else None,
+        "llm_calls": fake.calls,
+        "llm_calls_per_question": round(fake.calls / questions, 2) if questions else None,
+        "llm_rate_limited": fake.rate_limited,
+        "llm_gateway": stats.get("llm_gateway"),
+        "prefetch": stats.get("prefetch"),
+        "http_health": stats.get("http_health"),
+        "ready_s": round(ready_s, 2),
+        "startup": stats.get("startup"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chains", type=int, default=4, help="concurrent POSTs, one chain each")
+    parser.add_argument("--length", type=int, default=5, help="questions per chain")
+    parser.add_argument("--rows", type=int, default=2000, help="rows per generated attachment")
+    parser.add_argument("--kinds", default=",".join(KINDS), help="question kinds to rotate through")
+    parser.add_argument("--workers", type=int, default=2, help="QUIZ_WORKERS for the app")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-jitter", type=float, default=0.2)
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth LLM call with a 429")
+    parser.add_argument("--groq-rpm", type=int, default=600)
+    parser.add_argument("--groq-tpm", type=int, default=1000000)
+    parser.add_argument("--email", default="24f2005903@ds.study.iitm.ac.in")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--app-log", default="", help="write the app's log here")
+    parser.add_argument("--json", action="store_true", help="print the raw report")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"Ready after {report['ready_s']}s (import {report['startup']['import_ms']}ms, warm-up {report['startup']['warmup_ms']}ms)")
+    print(f"Chains: {report['chains']} x {args.length} questions, {report['workers']} workers")
+    print(f"Questions: {report['questions']} ({report['correct']} correct) in {report['wall_s']}s -> {report['questions_per_s']} q/s")
+    print(f"Latency: p50 {report['latency_s']['p50']}s, p95 {report['latency_s']['p95']}s, p99 {report['latency_s']['p99']}s")
+    print(f"By kind (median): {report['latency_by_kind_s']}")
+    print(f"Peak RSS: {report['peak_rss_mb']} MB")
+    print(f"LLM calls: {report['llm_calls']} ({report['llm_calls_per_question']}/question, {report['llm_rate_limited']} rate limited)")
+    health = report["http_health"] or {}
+    print(f"Hedged GETs: {health.get('hedges', 0)} ({health.get('hedge_wins', 0)} won), {health.get('rejected', 0)} breaker rejections")
+    if report["unfinished_jobs"]:
+        print(f"⚠️ {report['unfinished_jobs']} jobs still running at timeout")
+
+
+if __name__ == "__main__":
+    main()
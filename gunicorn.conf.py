@@ -0,0 +1,15 @@
+"""Gunicorn hooks that warm the app before the first quiz arrives (read automatically from the working directory)"""
+
+
+def when_ready(server):
+    # With --preload the app is already imported in the master; warm the fork-safe parts once here
+    # so every worker inherits them copy-on-write
+    if server.cfg.preload_app:
+        import app
+        app.warm_up()
+
+
+def post_worker_init(worker):
+    # Connection pools belong to each worker, and /ready reports this worker's progress
+    import app
+    app.start_warm_up()